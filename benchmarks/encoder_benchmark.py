@@ -0,0 +1,111 @@
+"""Parity check and throughput benchmark for server.algos.encoder.
+
+    python -m benchmarks.encoder_benchmark [--repeat 5]
+    python -m benchmarks.encoder_benchmark --write-reference
+
+Parity is checked against fixed sentence-transformers embeddings of the
+corpus in benchmarks/data/reference_embeddings.npy, and batched encoding
+against unbatched single-text encoding (which catches padding and pooling
+mistakes). Exits non-zero on mismatch or if the reference file is missing.
+--write-reference regenerates that file and needs sentence-transformers;
+rerun it whenever corpus.txt changes.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from server.algos import encoder
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "corpus.txt")
+REFERENCE_PATH = os.path.join(os.path.dirname(__file__), "data", "reference_embeddings.npy")
+PARITY_THRESHOLD = 0.999
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_reference(texts: list[str], path: str = REFERENCE_PATH) -> None:
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(encoder.TOKENIZER_NAME)
+    vectors = model.encode(texts, normalize_embeddings=True).astype(np.float32)
+    np.save(path, vectors)
+    print(f"wrote {vectors.shape[0]} reference embeddings to {path}")
+
+
+def load_reference(texts: list[str], path: str = REFERENCE_PATH):
+    if not os.path.exists(path):
+        print(f"no reference embeddings at {path}; generate them with --write-reference "
+              "(needs sentence-transformers)")
+        return None
+    expected = np.load(path)
+    if expected.shape[0] != len(texts):
+        print(f"{path} has {expected.shape[0]} rows for {len(texts)} corpus texts; "
+              "regenerate it with --write-reference")
+        return None
+    return expected
+
+
+def check_parity(texts: list[str]) -> bool:
+    actual = encoder.encode_onnx(texts)
+    single = np.vstack([encoder.encode_onnx(t) for t in texts])
+    ok = True
+    for name, expected in (("sentence-transformers reference", load_reference(texts)),
+                           ("single-text encode_onnx", single)):
+        if expected is None:
+            ok = False
+            continue
+        cosines = np.sum(actual * expected, axis=1)
+        print(f"parity vs {name}: min cosine {cosines.min():.6f}, mean {cosines.mean():.6f}")
+        ok = ok and bool(cosines.min() >= PARITY_THRESHOLD)
+    return ok
+
+
+def texts_per_second(fn, texts: list[str], repeat: int) -> float:
+    fn(texts[:4])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(texts)
+    return len(texts) * repeat / (time.perf_counter() - start)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--write-reference", action="store_true",
+                        help="regenerate the reference embeddings with sentence-transformers and exit")
+    args = parser.parse_args(argv)
+
+    texts = load_corpus()
+    if args.write_reference:
+        write_reference(texts)
+        return 0
+    ok = check_parity(texts)
+
+    def one_at_a_time(batch):
+        for text in batch:
+            encoder.encode_onnx(text)
+
+    def micro_batched(batch):
+        # One request per text, as concurrent callers would submit them
+        futures = [encoder.batcher.submit([text]) for text in batch]
+        for future in futures:
+            future.result()
+
+    print(f"{len(texts)} texts x {args.repeat} repeats")
+    print(f"  one text per call:   {texts_per_second(one_at_a_time, texts, args.repeat):8.1f} texts/sec")
+    for batch_size in (8, 32, 64):
+        rate = texts_per_second(lambda b: encoder.encode_onnx(b, batch_size=batch_size), texts, args.repeat)
+        print(f"  batch_size={batch_size:<3}        {rate:8.1f} texts/sec")
+    print(f"  micro-batched:       {texts_per_second(micro_batched, texts, args.repeat):8.1f} texts/sec")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Load-test getFeedSkeleton against local upstream stubs.
+
+    python -m benchmarks.feed_load_benchmark [--requests 2000] [--concurrency 32]
+        [--latency-ms 50] [--jitter-ms 10] [--error-rate 0] [--cold-rounds 20]
+
+Starts benchmarks.upstream_stubs on a local port, points the server at it,
+creates one feed (account and topic sources plus filters) in a temporary
+directory and drives the FastAPI app in-process through three scenarios:
+
+    hit    every request is served from a fresh in-memory cache
+    stale  every request finds the cache past CACHE_TTL (serve + background refresh)
+    cold   caches are dropped before each round of concurrent requests
+
+For each it reports p50/p95/p99 latency, throughput, non-200 responses and
+upstream calls by endpoint.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.upstream_stubs import StubServer, StubUpstream
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "corpus.txt")
+FEED_URI = "at://did:plc:loadtest/app.bsky.feed.generator/load"
+PAGE_LIMIT = 30
+
+
+def create_feed(authors: int, topics: int, texts: list[str]) -> None:
+    """Insert the load-test feed and its sources directly (no Bluesky login)."""
+    from server.algos.embedding_cache import to_blob
+    from server.algos.encoder import EMBEDDING_DIM, EMBEDDING_MODEL_ID
+    from server.models import Feed, FeedSource
+
+    feed = Feed.create(uri=FEED_URI, handle="loadtest.test", record_name="load", display_name="Load test")
+    rng = np.random.default_rng(0)
+    for i in range(authors):
+        FeedSource.create(feed=feed, source_type="account_preference", identifier=f"did:plc:author{i:04d}")
+    for i in range(topics):
+        # random unit vectors stand in for topic embeddings, so no model is needed
+        vector = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        FeedSource.create(
+            feed=feed, source_type="topic_preference", identifier=f"topic {i}",
+            embedding=to_blob(vector), embedding_model=EMBEDDING_MODEL_ID,
+        )
+    FeedSource.create(feed=feed, source_type="account_filter", identifier="did:plc:stub00001")
+    FeedSource.create(feed=feed, source_type="topic_filter", identifier=texts[0].split()[0])
+
+
+async def timed_get(client, latencies: list, statuses: dict, before=None) -> None:
+    if before is not None:
+        before()
+    start = time.perf_counter()
+    r = await client.get("/xrpc/app.bsky.feed.getFeedSkeleton", params={"feed": FEED_URI, "limit": PAGE_LIMIT})
+    latencies.append(time.perf_counter() - start)
+    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+
+async def run_load(client, requests: int, concurrency: int, before=None):
+    """`requests` GETs from `concurrency` workers; returns (latencies, statuses)."""
+    latencies, statuses = [], {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            await timed_get(client, latencies, statuses, before)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+async def drop_caches(handler) -> None:
+    """Wait out any running build, then forget the feed in both cache tiers."""
+    from server.algos.response_cache import response_cache
+    from server.models import FeedCache
+    from server.storage import run_write
+
+    while handler.flight.in_flight:
+        await asyncio.sleep(0.01)
+    response_cache.invalidate(FEED_URI)
+    await run_write(FeedCache.delete().where(FeedCache.feed_uri == FEED_URI).execute)
+
+
+async def run_scenarios(args, upstream: StubUpstream) -> list[tuple]:
+    import httpx
+
+    from server.algos.feed import CACHE_TTL, make_handler
+    from server.algos.response_cache import response_cache
+    from server.app import algos, app
+    from server.http_client import close_client
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+    handler = algos[FEED_URI] = make_handler(FEED_URI)
+
+    def make_stale():
+        entry = response_cache.get(FEED_URI)
+        if entry is not None:
+            entry.built_at = time.time() - CACHE_TTL - 1
+
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://feedgen") as client:
+        for scenario in args.scenarios:
+            await drop_caches(handler)
+            if scenario in ("hit", "stale"):
+                await timed_get(client, [], {})  # build once, untimed
+
+            calls_before = upstream.calls.copy()
+            start = time.perf_counter()
+            if scenario == "hit":
+                latencies, statuses = await run_load(client, args.requests, args.concurrency)
+            elif scenario == "stale":
+                latencies, statuses = await run_load(client, args.requests, args.concurrency, before=make_stale)
+            else:
+                latencies, statuses = [], {}
+                for _ in range(args.cold_rounds):
+                    await drop_caches(handler)
+                    await asyncio.gather(
+                        *(timed_get(client, latencies, statuses) for _ in range(args.concurrency))
+                    )
+            elapsed = time.perf_counter() - start
+            while handler.flight.in_flight:  # count calls of the last background refresh too
+                await asyncio.sleep(0.01)
+            calls = upstream.calls - calls_before
+            rows.append((scenario, latencies, statuses, elapsed, calls))
+
+    await close_client()
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per hit/stale scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cold-rounds", type=int, default=20, help="rounds of --concurrency cold requests")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream calls failing with 500")
+    parser.add_argument("--authors", type=int, default=10, help="account_preference sources")
+    parser.add_argument("--topics", type=int, default=3, help="topic_preference sources")
+    parser.add_argument("--scenarios", nargs="+", default=["hit", "stale", "cold"], choices=["hit", "stale", "cold"])
+    args = parser.parse_args(argv)
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    upstream = StubUpstream(args.latency_ms, args.jitter_ms, args.error_rate, texts)
+    server = StubServer(upstream).start()
+
+    # Point the server at the stubs and keep it off the network and the
+    # firehose-fed stores, before anything imports server.config
+    os.environ["BSKY_APPVIEW_URL"] = os.environ["CUSTOM_API_URL"] = server.url
+    os.environ.setdefault("HOSTNAME", "localhost")
+    for flag in ("AUTHOR_INDEX", "LOCAL_POST_STORE", "LOCAL_VECTOR_INDEX"):
+        os.environ[flag] = "false"
+    tmp = tempfile.TemporaryDirectory()
+    os.chdir(tmp.name)
+
+    create_feed(args.authors, args.topics, texts)
+    try:
+        rows = asyncio.run(run_scenarios(args, upstream))
+    finally:
+        server.stop()
+
+    print(f"upstream latency {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, error rate {args.error_rate:.1%}, "
+          f"concurrency {args.concurrency}")
+    print(f"{'scenario':<9}{'requests':>9}{'non-200':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+          f"{'authorFeed':>11}{'getPosts':>9}{'vector':>7}")
+    for scenario, latencies, statuses, elapsed, calls in rows:
+        ms = np.array(latencies) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        failed = sum(n for status, n in statuses.items() if status != 200)
+        print(f"{scenario:<9}{len(ms):>9}{failed:>8}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{len(ms) / elapsed:>9.0f}"
+              f"{calls['getAuthorFeed']:>11}{calls['getPosts']:>9}{calls['vectorSearch']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
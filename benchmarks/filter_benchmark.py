@@ -0,0 +1,90 @@
+"""Benchmark compiled keyword filters against the per-keyword substring scan.
+
+    python -m benchmarks.filter_benchmark [--keywords 5000] [--posts 5000]
+
+Keywords and posts are generated from the local corpus plus random words,
+so runs are repeatable (fixed seed) and need no network or database.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from benchmarks.encoder_benchmark import load_corpus
+from server.algos import filters
+
+
+def make_keywords(vocabulary: list[str], count: int, rng: random.Random) -> list[str]:
+    # a few real words so some posts match; the rest never occur
+    keywords = set(rng.sample(vocabulary, min(len(vocabulary) // 20, count)))
+    while len(keywords) < count:
+        length = rng.randint(4, 10)
+        word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(length))
+        # some multi-word phrases, as blueprints use ("bad language")
+        if rng.random() < 0.2:
+            word += " " + rng.choice(vocabulary)
+        keywords.add(word)
+    return sorted(keywords)
+
+
+def make_posts(corpus: list[str], count: int, rng: random.Random) -> list[dict]:
+    return [
+        {"author": {"did": f"did:plc:{i}"}, "record": {"text": " ".join(rng.sample(corpus, 2))}}
+        for i in range(count)
+    ]
+
+
+def naive_blocks(post: dict, banned_keywords: set) -> bool:
+    """The previous should_block_post keyword check."""
+    text = post.get("record", {}).get("text", "").lower()
+    for kw in banned_keywords:
+        if kw in text:
+            return True
+    return False
+
+
+def timed(fn, posts) -> tuple[float, int]:
+    start = time.perf_counter()
+    blocked = sum(fn(post) for post in posts)
+    return time.perf_counter() - start, blocked
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keywords", type=int, default=5000)
+    parser.add_argument("--posts", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    corpus = load_corpus()
+    vocabulary = sorted({w for line in corpus for w in re.findall(r"[a-z]+", line.lower()) if len(w) > 2})
+    keywords = make_keywords(vocabulary, args.keywords, rng)
+    posts = make_posts(corpus, args.posts, rng)
+
+    keyword_set = set(keywords)
+    start = time.perf_counter()
+    compiled_substring = filters.CompiledFilter(frozenset(), filters.KeywordMatcher(keywords, word_boundary=False))
+    compiled_words = filters.CompiledFilter(frozenset(), filters.KeywordMatcher(keywords, word_boundary=True))
+    compile_time = (time.perf_counter() - start) / 2
+
+    backend = "pyahocorasick" if filters.ahocorasick else "pure Python"
+    print(f"{len(keywords)} keywords x {len(posts)} posts ({backend} automaton, compile {compile_time * 1000:.1f} ms)")
+
+    naive_time, naive_blocked = timed(lambda p: naive_blocks(p, keyword_set), posts)
+    substring_time, substring_blocked = timed(compiled_substring.blocks, posts)
+    words_time, words_blocked = timed(compiled_words.blocks, posts)
+
+    for name, elapsed, blocked in (
+        ("substring scan (old)", naive_time, naive_blocked),
+        ("automaton, substring", substring_time, substring_blocked),
+        ("automaton, whole word", words_time, words_blocked),
+    ):
+        print(f"  {name:<24}{elapsed * 1000:>10.1f} ms {len(posts) / elapsed:>12.0f} posts/sec  blocked {blocked}")
+
+    # substring mode must agree exactly with the old check
+    return 0 if substring_blocked == naive_blocked else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
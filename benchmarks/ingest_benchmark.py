@@ -0,0 +1,146 @@
+"""Offline firehose ingestion benchmark: events/sec, per-stage time and peak memory.
+
+    python -m benchmarks.ingest_benchmark [--events 50000] [--frames firehose.frames.gz]
+                                          [--workers 0] [--queue-size 0] [--overflow-policy block]
+                                          [--min-events-per-sec N]
+
+Frames are synthetic commits (server.frame_source.synthetic_frames) unless
+--frames points at a file recorded with FIREHOSE_RECORD_PATH. The first pass
+times each stage of the inline path separately; the second replays the same
+frames through data_stream.run end to end. Databases are created in a
+temporary directory. With --min-events-per-sec, exits non-zero when the end
+to end rate falls below it, so CI can catch regressions with no network.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "corpus.txt")
+# Flush buffered writes this often during the staged pass, like Checkpointer
+FLUSH_EVERY = 5000
+
+STAGES = ("parse", "car decode", "record model", "filter", "db write")
+
+
+def staged_pass(frames: list[bytes], collections) -> dict:
+    """Run the inline ingestion path frame by frame, timing each stage."""
+    from atproto import CAR, firehose_models, models, parse_subscribe_repos_message
+
+    from server import data_stream
+    from server.data_filter import operations_callback
+    from server.write_buffer import post_buffer
+
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    class TimedCAR:
+        @staticmethod
+        def from_bytes(data):
+            start = time.perf_counter()
+            car = CAR.from_bytes(data)
+            timings["car decode"] += time.perf_counter() - start
+            return car
+
+    # only explicit flushes below, so they can be timed on their own
+    post_buffer.max_pending, post_buffer.max_age = len(frames) * 10, 3600
+    data_stream.CAR = TimedCAR
+    clock = time.perf_counter
+    try:
+        for i, raw in enumerate(frames, 1):
+            t0 = clock()
+            commit = parse_subscribe_repos_message(firehose_models.Frame.from_bytes(raw))
+            t1 = clock()
+            ops = None
+            if isinstance(commit, models.ComAtprotoSyncSubscribeRepos.Commit) and commit.blocks:
+                ops = data_stream._get_ops_by_type(commit, collections)
+            t2 = clock()
+            if ops:
+                operations_callback(ops)
+            t3 = clock()
+            timings["parse"] += t1 - t0
+            timings["record model"] += t2 - t1
+            timings["filter"] += t3 - t2
+
+            if i % FLUSH_EVERY == 0 or i == len(frames):
+                post_buffer.flush()
+                timings["db write"] += clock() - t3
+    finally:
+        data_stream.CAR = CAR
+
+    # _get_ops_by_type time includes the CAR decode
+    timings["record model"] -= timings["car decode"]
+    return timings
+
+
+def end_to_end_pass(frames: list[bytes], collections, workers: int, queue_size: int, policy: str) -> float:
+    """Replay the frames through data_stream.run; return elapsed seconds."""
+    from server import data_stream
+    from server.data_filter import operations_callback
+    from server.frame_source import ReplaySource
+    from server.write_buffer import MAX_AGE, MAX_PENDING, post_buffer
+
+    post_buffer.max_pending, post_buffer.max_age = MAX_PENDING, MAX_AGE
+    start = time.perf_counter()
+    data_stream.run(
+        "benchmark", operations_callback, None, workers, collections, source=ReplaySource(frames),
+        queue_size=queue_size, overflow_policy=policy,
+    )
+    post_buffer.flush()
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50_000, help="synthetic frames to generate")
+    parser.add_argument("--frames", help="replay a recorded frame file instead")
+    parser.add_argument("--workers", type=int, default=0, help="FirehoseWorkerPool size for the end-to-end pass")
+    parser.add_argument("--queue-size", type=int, default=0, help="FrameQueue size for the end-to-end pass")
+    parser.add_argument("--overflow-policy", default="block", choices=["block", "drop", "spill"])
+    parser.add_argument("--min-events-per-sec", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    if args.frames:
+        args.frames = os.path.abspath(args.frames)
+    tmp = tempfile.TemporaryDirectory()
+    os.chdir(tmp.name)  # before server.database opens feed_database.db
+
+    from server.data_filter import INTERESTED_COLLECTIONS
+    from server.frame_source import read_frames, synthetic_frames
+
+    if args.frames:
+        frames = list(read_frames(args.frames))
+        source = args.frames
+    else:
+        with open(CORPUS_PATH, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        frames = list(synthetic_frames(args.events, texts))
+        source = "synthetic"
+    collections = frozenset(INTERESTED_COLLECTIONS)
+    print(f"{len(frames):,} frames ({source}), {sum(map(len, frames)) / 2**20:.1f} MiB")
+
+    timings = staged_pass(frames, collections)
+    total = sum(timings.values())
+    print(f"\nstaged pass: {len(frames) / total:,.0f} events/sec")
+    print(f"{'stage':<14}{'total s':>10}{'us/event':>10}{'share':>8}")
+    for stage in STAGES:
+        t = timings[stage]
+        print(f"{stage:<14}{t:>10.2f}{t / len(frames) * 1e6:>10.1f}{t / total:>8.0%}")
+
+    elapsed = end_to_end_pass(frames, collections, args.workers, args.queue_size, args.overflow_policy)
+    rate = len(frames) / elapsed
+    print(f"\nend to end (workers={args.workers}, queue={args.queue_size} {args.overflow_policy}): "
+          f"{rate:,.0f} events/sec")
+
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS: {peak_mib:,.0f} MiB")
+
+    if args.min_events_per_sec is not None and rate < args.min_events_per_sec:
+        print(f"FAIL: below --min-events-per-sec {args.min_events_per_sec:,.0f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
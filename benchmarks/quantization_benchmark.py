@@ -0,0 +1,74 @@
+"""Compare the fp32 and INT8 embedding models on latency, throughput and agreement.
+
+    python -m benchmarks.quantization_benchmark [--repeat 5] [--top-k 5]
+
+Agreement is reported as the cosine similarity between each text's fp32 and
+INT8 embeddings, and as the overlap of top-k nearest neighbours within the
+corpus (how much retrieval results would change by switching models).
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.encoder_benchmark import load_corpus
+from server.algos import encoder
+
+
+def latency_ms(session, texts: list[str]) -> np.ndarray:
+    """Single-text encode latency for every text, in milliseconds."""
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        encoder.encode_onnx(text, session=session)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def throughput(session, texts: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoder.encode_onnx(texts, session=session)
+    return len(texts) * repeat / (time.perf_counter() - start)
+
+
+def top_k_overlap(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    """Mean fraction of shared top-k neighbours (excluding self) between two embeddings."""
+    def neighbours(emb):
+        sims = emb @ emb.T
+        np.fill_diagonal(sims, -np.inf)
+        return np.argsort(-sims, axis=1)[:, :k]
+
+    na, nb = neighbours(a), neighbours(b)
+    return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(na, nb)]))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    texts = load_corpus()
+    sessions = {variant: encoder.create_session(variant) for variant in encoder.MODEL_VARIANTS}
+    embeddings = {}
+
+    print(f"{len(texts)} texts, {args.repeat} repeats")
+    print(f"{'variant':<8}{'p50 ms':>10}{'p95 ms':>10}{'texts/sec':>12}")
+    for variant, session in sessions.items():
+        encoder.encode_onnx(texts[:4], session=session)  # warm-up
+        timings = latency_ms(session, texts)
+        rate = throughput(session, texts, args.repeat)
+        embeddings[variant] = encoder.encode_onnx(texts, session=session)
+        print(f"{variant:<8}{np.percentile(timings, 50):>10.2f}{np.percentile(timings, 95):>10.2f}{rate:>12.1f}")
+
+    fp32, int8 = embeddings["fp32"], embeddings["int8"]
+    cosines = np.sum(fp32 * int8, axis=1)
+    print(f"cosine(fp32, int8): min {cosines.min():.4f}, mean {cosines.mean():.4f}")
+    print(f"top-{args.top_k} neighbour overlap: {top_k_overlap(fp32, int8, args.top_k):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Measure firehose routing cost per post as the number of feeds grows.
+
+    python -m benchmarks.router_benchmark [--feeds 10 100 1000 5000] [--posts 5000]
+
+Each synthetic feed follows a few accounts, has a few topic phrases and a
+few blocked accounts/words, drawn from the local corpus and random words,
+so runs are repeatable (fixed seed) and need no network or database.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from benchmarks.encoder_benchmark import load_corpus
+from server.router import RoutingTable
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+
+
+def make_sources(feeds: int, vocabulary: list[str], rng: random.Random) -> list[tuple]:
+    sources = []
+    for f in range(feeds):
+        feed_uri = f"at://did:plc:bench/app.bsky.feed.generator/{f}"
+        for _ in range(5):
+            sources.append((feed_uri, "account_preference", f"did:plc:{rng.randrange(100_000)}"))
+        for _ in range(3):
+            # mostly rare topics, a few real words and two-word phrases
+            topic = rng.choice(vocabulary) if rng.random() < 0.05 else random_word(rng)
+            if rng.random() < 0.3:
+                topic += " " + rng.choice(vocabulary)
+            sources.append((feed_uri, "topic_preference", topic))
+        sources.append((feed_uri, "account_filter", f"did:plc:{rng.randrange(100_000)}"))
+        sources.append((feed_uri, "topic_filter", random_word(rng)))
+    return sources
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--feeds", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--posts", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    corpus = load_corpus()
+    vocabulary = sorted({w for line in corpus for w in re.findall(r"\w+", line.lower()) if len(w) > 3})
+    posts = [
+        (f"did:plc:{rng.randrange(100_000)}", " ".join(rng.sample(corpus, 2)))
+        for _ in range(args.posts)
+    ]
+
+    print(f"{'feeds':>8}{'build ms':>10}{'posts/sec':>12}{'us/post':>10}{'routed':>10}")
+    for feeds in args.feeds:
+        sources = make_sources(feeds, vocabulary, rng)
+        start = time.perf_counter()
+        table = RoutingTable.from_sources(sources)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        routed = sum(len(table.route(author, text)) for author, text in posts)
+        elapsed = time.perf_counter() - start
+        print(f"{feeds:>8}{build_ms:>10.1f}{len(posts) / elapsed:>12,.0f}"
+              f"{elapsed / len(posts) * 1e6:>10.1f}{routed:>10}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Local stand-ins for the feed's upstream APIs, with injectable latency and errors.
+
+    python -m benchmarks.upstream_stubs [--port 8900] [--latency-ms 50] [--error-rate 0.01]
+
+Serves app.bsky.feed.getAuthorFeed, app.bsky.feed.getPosts and
+/vector/search/posts with deterministic fake data. Point the server at it
+with BSKY_APPVIEW_URL and CUSTOM_API_URL (both http://127.0.0.1:<port>).
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Posts per author and per vector search result set
+AUTHOR_POSTS = 100
+SEARCH_RESULTS = 100
+SEARCH_AUTHORS = 500
+BASE_TIME = 1_700_000_000
+
+
+def _number(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def _iso(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ts))
+
+
+def _post_uri(did: str, n: int) -> str:
+    return f"at://{did}/app.bsky.feed.post/{n:013d}"
+
+
+class StubUpstream:
+    """The stub app plus its knobs and per-endpoint call counters."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 texts: list[str] = None, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.texts = texts or ["hello from the stub appview"]
+        self.calls = Counter()
+        self.errors = Counter()
+        self._rng = random.Random(seed)
+        self.app = self._create_app()
+
+    async def _delay_or_fail(self, endpoint: str):
+        """Sleep for the configured latency; return an error response if one is injected."""
+        self.calls[endpoint] += 1
+        delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self._rng.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            return JSONResponse({"error": "InternalServerError", "message": "injected"}, status_code=500)
+        return None
+
+    def _post_view(self, uri: str) -> dict:
+        did = uri.split("/")[2]
+        n = _number(uri)
+        ts = BASE_TIME + n % 86_400
+        return {
+            "uri": uri,
+            "cid": f"bafy{n:x}",
+            "author": {"did": did, "handle": f"{did.rsplit(':', 1)[-1]}.test"},
+            "record": {"$type": "app.bsky.feed.post", "text": self.texts[n % len(self.texts)], "createdAt": _iso(ts)},
+            "indexedAt": _iso(ts),
+        }
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/xrpc/app.bsky.feed.getAuthorFeed")
+        async def get_author_feed(actor: str, limit: int = 50):
+            error = await self._delay_or_fail("getAuthorFeed")
+            if error:
+                return error
+            start = _number(actor) % 1_000_000
+            uris = [_post_uri(actor, start + i) for i in range(min(limit, AUTHOR_POSTS))]
+            return {"feed": [{"post": self._post_view(uri)} for uri in uris]}
+
+        @app.get("/xrpc/app.bsky.feed.getPosts")
+        async def get_posts(request: Request):
+            error = await self._delay_or_fail("getPosts")
+            if error:
+                return error
+            uris = request.query_params.getlist("uris")[:25]
+            return {"posts": [self._post_view(uri) for uri in uris]}
+
+        @app.post("/vector/search/posts")
+        async def vector_search(request: Request):
+            error = await self._delay_or_fail("vectorSearch")
+            if error:
+                return error
+            start = _number((await request.body()).decode()[:64])
+            return [
+                {"repo": f"did:plc:stub{(start + i) % SEARCH_AUTHORS:05d}", "rkey": f"{start % 1_000_000 + i:013d}"}
+                for i in range(SEARCH_RESULTS)
+            ]
+
+        return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    """Run a StubUpstream with uvicorn on a background thread."""
+
+    def __init__(self, upstream: StubUpstream, port: int = None):
+        self.upstream = upstream
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(upstream.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="upstream-stub", daemon=True)
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    upstream = StubUpstream(args.latency_ms, args.jitter_ms, args.error_rate)
+    uvicorn.run(upstream.app, host="127.0.0.1", port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
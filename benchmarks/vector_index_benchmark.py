@@ -0,0 +1,74 @@
+"""Measure the local vector index: build rate and top-k query latency.
+
+    python -m benchmarks.vector_index_benchmark [--vectors 2000000] [--queries 50] [--encode]
+
+Random unit vectors are inserted in firehose-sized batches to measure the
+raw build rate at a few million rows; --encode also times the ONNX encoder
+on the corpus, which is what bounds ingest in practice.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from server.algos.encoder import EMBEDDING_DIM
+from server.vector_index import EMBED_BATCH_SIZE, VectorIndex
+
+
+def random_unit_vectors(rng, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=2_000_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=30)
+    parser.add_argument("--encode", action="store_true", help="also time the encoder on the corpus")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    block = random_unit_vectors(rng, 8192, EMBEDDING_DIM)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(os.path.join(tmp, "index.f32"), args.vectors, EMBEDDING_DIM, max_age=3600)
+
+        start = time.perf_counter()
+        for offset in range(0, args.vectors, EMBED_BATCH_SIZE):
+            n = min(EMBED_BATCH_SIZE, args.vectors - offset)
+            rows = block[offset % len(block):][:n]
+            index.add_vectors([f"at://bench/{offset + i}" for i in range(len(rows))], rows)
+        build = time.perf_counter() - start
+        print(f"built {len(index):,} x {EMBEDDING_DIM} in {build:.1f}s ({len(index) / build:,.0f} vectors/sec)")
+
+        index.delete("at://bench/0")
+        queries = random_unit_vectors(rng, args.queries, EMBEDDING_DIM)
+        index.search(queries[0], args.top_k)  # fault the pages in
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            results = index.search(query, args.top_k)
+            timings.append((time.perf_counter() - start) * 1000)
+        assert len(results) == args.top_k and "at://bench/0" not in {uri for uri, _ in results}
+        print(f"top-{args.top_k} query p50 {np.percentile(timings, 50):.1f} ms, p95 {np.percentile(timings, 95):.1f} ms")
+
+    if args.encode:
+        from benchmarks.encoder_benchmark import load_corpus
+        from server.algos.encoder import encode_onnx
+
+        texts = load_corpus()
+        encode_onnx(texts[:4])  # warm-up
+        start = time.perf_counter()
+        encode_onnx(texts)
+        print(f"encoder: {len(texts) / (time.perf_counter() - start):,.0f} posts/sec")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 from .feed import make_handler
-from server.models import db, Feed, FeedSource, FeedCache
+from server import router
+from server.author_index import track_account_sources
+from server.models import db, Feed, FeedSource, FeedCache, add_missing_columns
 
 # Dictionary mapping feed URI to handler
 algos = {}
@@ -9,6 +11,11 @@ db.connect(reuse_if_open=True)
 
 # Ensure tables exist
 db.create_tables([Feed, FeedSource, FeedCache], safe=True)
+add_missing_columns()
+
+# Follow suggested accounts on the firehose, and route posts to feeds
+track_account_sources()
+router.reload()
 
 # Load all persisted feeds into algos
 for feed in Feed.select():
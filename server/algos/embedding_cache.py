@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from server import config
+
+# Vectors are persisted as raw little-endian float32 bytes (1.5 KB for 384 dims)
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def to_blob(vector) -> bytes:
+    """Serialize an embedding vector for storage in a BlobField."""
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def from_blob(blob: bytes) -> np.ndarray:
+    """Deserialize an embedding vector stored with to_blob."""
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+
+class EmbeddingLRU:
+    """Thread-safe LRU of embedding vectors keyed by (model, text)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is not None:
+                self._data.move_to_end(key)
+            return vector
+
+    def put(self, key, vector) -> None:
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+topic_embeddings = EmbeddingLRU(config.TOPIC_EMBEDDING_CACHE_SIZE)
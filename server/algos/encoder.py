@@ -0,0 +1,294 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from server import config, metrics
+from server.logger import logger
+
+# ONNX model setup
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "all-MiniLM-L6-v2.onnx")
+# Dynamic INT8 variant, generated from MODEL_PATH on first use
+QUANTIZED_MODEL_PATH = os.path.join(os.path.dirname(__file__), "all-MiniLM-L6-v2.int8.onnx")
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+MODEL_VARIANTS = ("fp32", "int8")
+MODEL_VARIANT = config.EMBEDDING_MODEL_VARIANT.lower()
+if MODEL_VARIANT not in MODEL_VARIANTS:
+    raise ValueError(f"Unknown EMBEDDING_MODEL_VARIANT: {config.EMBEDDING_MODEL_VARIANT}")
+
+# Stored alongside persisted topic vectors; bump when the embedding changes
+EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2/mean-pooled"
+if MODEL_VARIANT != "fp32":
+    EMBEDDING_MODEL_ID += f"/{MODEL_VARIANT}"
+
+# Size of the sentence embeddings
+EMBEDDING_DIM = 384
+
+# all-MiniLM-L6-v2 was trained with inputs truncated to 256 word pieces
+MAX_SEQ_LENGTH = 256
+# Texts per session.run; texts are sorted by length first so each batch
+# is padded only to its own longest member
+BATCH_SIZE = 32
+
+# Micro-batching: concurrent callers are merged into one session.run
+MICRO_BATCH_MAX_SIZE = 64
+MICRO_BATCH_MAX_WAIT = 0.005  # seconds
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+# The tokenizer and session are loaded on first use (or by warm_up_in_background)
+# so importing this module, and therefore starting the app, stays cheap.
+_tokenizer = None
+_session = None
+_load_lock = threading.Lock()
+_ready = threading.Event()
+_warming = threading.Event()
+
+
+def session_options():
+    """Build ONNX Runtime SessionOptions from config."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    # 0 lets ONNX Runtime pick; set explicitly when running several workers
+    options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = config.ONNX_INTER_OP_THREADS
+    level = _GRAPH_OPTIMIZATION_LEVELS.get(config.ONNX_GRAPH_OPTIMIZATION_LEVEL.lower())
+    if level is None:
+        raise ValueError(f"Unknown ONNX_GRAPH_OPTIMIZATION_LEVEL: {config.ONNX_GRAPH_OPTIMIZATION_LEVEL}")
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)
+    options.enable_cpu_mem_arena = config.ONNX_ENABLE_CPU_MEM_ARENA
+    options.enable_mem_pattern = config.ONNX_ENABLE_MEM_PATTERN
+    return options
+
+
+def quantize_model(source: str = None, target: str = None) -> str:
+    """Write a dynamically INT8-quantized copy of the model and return its path.
+
+    Needs the `onnx` package in addition to onnxruntime. The model is
+    written to a temporary file and renamed into place, so a crash or a
+    second worker quantizing at the same time never leaves a truncated
+    model at `target`.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    source = source or MODEL_PATH
+    target = target or QUANTIZED_MODEL_PATH
+    root, ext = os.path.splitext(target)
+    tmp = f"{root}.{os.getpid()}.tmp{ext}"
+    start = time.monotonic()
+    try:
+        quantize_dynamic(source, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    logger.info(f"Quantized embedding model written to {target} in {time.monotonic() - start:.1f}s")
+    return target
+
+
+def model_path(variant: str = MODEL_VARIANT) -> str:
+    """Return the model file for a variant, quantizing it first if needed."""
+    if variant == "int8":
+        if not os.path.exists(QUANTIZED_MODEL_PATH):
+            quantize_model()
+        return QUANTIZED_MODEL_PATH
+    return MODEL_PATH
+
+
+def create_session(variant: str = MODEL_VARIANT):
+    """Build a new InferenceSession for a model variant."""
+    import onnxruntime as ort
+
+    return ort.InferenceSession(
+        model_path(variant), sess_options=session_options(), providers=["CPUExecutionProvider"]
+    )
+
+
+def load_model():
+    """Return (tokenizer, session), loading them on the first call."""
+    global _tokenizer, _session
+    if _ready.is_set():
+        return _tokenizer, _session
+
+    with _load_lock:
+        if not _ready.is_set():
+            from transformers import AutoTokenizer
+
+            start = time.monotonic()
+            _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+            _session = create_session()
+            _ready.set()
+            logger.info(f"Embedding model ({MODEL_VARIANT}) loaded in {time.monotonic() - start:.1f}s")
+
+    return _tokenizer, _session
+
+
+def is_ready() -> bool:
+    """Return True once the tokenizer and session are loaded."""
+    return _ready.is_set()
+
+
+def is_warming() -> bool:
+    """Return True while a warm_up_in_background() load is still running."""
+    return _warming.is_set()
+
+
+def warm_up_in_background() -> threading.Thread:
+    """Load the model on a background thread so the first request doesn't pay for it."""
+    def warm_up():
+        try:
+            load_model()
+        except Exception as e:
+            logger.error(f"Embedding model warm-up failed: {e}")
+        finally:
+            _warming.clear()
+
+    _warming.set()
+    thread = threading.Thread(target=warm_up, name="encoder-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_batch(token_ids: list[list[int]], session) -> np.ndarray:
+    """Run one padded batch through the model and mean-pool the tokens."""
+    tokenizer, _ = load_model()
+    seq_len = max(len(ids) for ids in token_ids)
+    input_ids = np.full((len(token_ids), seq_len), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(token_ids), seq_len), dtype=np.int64)
+    for i, ids in enumerate(token_ids):
+        input_ids[i, :len(ids)] = ids
+        attention_mask[i, :len(ids)] = 1
+
+    feeds = {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "token_type_ids": np.zeros_like(input_ids),
+    }
+    input_names = {i.name for i in session.get_inputs()}
+    outputs = session.run(None, {k: v for k, v in feeds.items() if k in input_names})
+
+    # outputs[0] is the per-token hidden state: (batch, seq_len, dim).
+    # Average over real tokens only, ignoring padding.
+    token_embeddings = outputs[0]
+    mask = attention_mask[:, :, None].astype(token_embeddings.dtype)
+    summed = (token_embeddings * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    return summed / counts
+
+
+def encode_onnx(texts, batch_size: int = BATCH_SIZE, session=None) -> np.ndarray:
+    """Return L2-normalized sentence embeddings, one row per text.
+
+    `session` defaults to the configured model; pass one from
+    create_session() to encode with a different variant.
+    """
+    if isinstance(texts, str):
+        texts = [texts]
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    tokenizer, default_session = load_model()
+    session = session or default_session
+    start_time = time.perf_counter()
+    token_ids = tokenizer(
+        list(texts), truncation=True, max_length=MAX_SEQ_LENGTH
+    )["input_ids"]
+
+    # Length bucketing: batch texts of similar length together
+    order = sorted(range(len(token_ids)), key=lambda i: len(token_ids[i]))
+    embeddings = None
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        pooled = _run_batch([token_ids[i] for i in idx], session)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+        embeddings[idx] = pooled
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    embeddings /= norms
+
+    metrics.encode_seconds.observe(time.perf_counter() - start_time)
+    metrics.encode_batch_size.observe(len(texts))
+    return embeddings
+
+
+class MicroBatcher:
+    """Merge concurrent encode requests into shared session.run calls.
+
+    Requests queued within MICRO_BATCH_MAX_WAIT of each other (up to
+    MICRO_BATCH_MAX_SIZE texts) are encoded together on a worker thread.
+    """
+
+    def __init__(self, encode_fn, max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+                 max_wait: float = MICRO_BATCH_MAX_WAIT):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, texts: list[str]) -> Future:
+        """Queue texts for encoding; the future resolves to their embeddings."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((list(texts), future))
+        return future
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="encoder-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            requests = [self._queue.get()]
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+
+            texts = [text for request_texts, _ in requests for text in request_texts]
+            try:
+                embeddings = self.encode_fn(texts)
+            except Exception as e:
+                logger.error(f"Batched encode of {len(texts)} texts failed: {e}")
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in requests:
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+batcher = MicroBatcher(encode_onnx)
+
+
+async def encode_async(texts) -> np.ndarray:
+    """Encode from async code without blocking the event loop."""
+    if isinstance(texts, str):
+        texts = [texts]
+    return await asyncio.wrap_future(batcher.submit(texts))
@@ -2,34 +2,74 @@ import os
 import json
 import httpx
 import numpy as np
-import onnxruntime as ort
-from transformers import AutoTokenizer
 import asyncio
 import time
+from server import config, metrics
+from server.http_client import get_client
+from server.algos.encoder import EMBEDDING_MODEL_ID, encode_onnx, encode_async
+from server.algos.embedding_cache import from_blob, to_blob, topic_embeddings
+from server.algos.response_cache import response_cache
+from server.algos.singleflight import SingleFlight
+from server.algos.scheduler import RequestRate
+from server.algos.filters import CompiledFilter, cached_filter, compile_filter
 from server.models import Feed, FeedSource, FeedCache
+from server.database import FeedCandidate
+from server.post_store import post_store
+from server.author_index import author_index
+from server.vector_index import vector_index
+from server.storage import run_read, run_write
 
 CACHE_TTL = 60  # seconds
 
+# Each build ranks this many candidates; pages are slices of that list
+CANDIDATE_DEPTH = config.FEED_CANDIDATE_DEPTH
+# getAuthorFeed returns at most 100 posts per call
+MAX_SOURCE_FETCH_LIMIT = 100
+# getFeedSkeleton page size bounds
+MAX_PAGE_LIMIT = 100
+
+# app.bsky.feed.getPosts accepts at most 25 URIs per call
+GET_POSTS_BATCH_SIZE = 25
+HYDRATION_CONCURRENCY = 4
+
+APPVIEW_URL = config.BSKY_APPVIEW_URL
 CUSTOM_API_URL = os.environ.get("CUSTOM_API_URL")
 
-# ONNX model setup
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "all-MiniLM-L6-v2.onnx")
-TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
-tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
-session = ort.InferenceSession(MODEL_PATH, providers=["CPUExecutionProvider"])
+class FeedBuildError(Exception):
+    """A build got nothing usable from upstream; the previous cache is kept."""
+
+
+def embed_topic(text: str) -> np.ndarray:
+    """Return the query vector used for topic_preference vector search."""
+    return encode_onnx(text)[0]
+
+
+async def topic_embedding(src: FeedSource) -> np.ndarray:
+    """Return the vector for a topic_preference source without re-encoding.
+
+    Looks in the in-process LRU first, then in the vector persisted on the
+    FeedSource row. Rows created before vectors were persisted (or by an
+    older model) are encoded once and written back.
+    """
+    key = (EMBEDDING_MODEL_ID, src.identifier)
+    vector = topic_embeddings.get(key)
+    if vector is not None:
+        return vector
+
+    if src.embedding and src.embedding_model == EMBEDDING_MODEL_ID:
+        vector = from_blob(src.embedding)
+    else:
+        vector = (await encode_async(src.identifier))[0]
+        await run_write(
+            FeedSource
+            .update(embedding=to_blob(vector), embedding_model=EMBEDDING_MODEL_ID)
+            .where(FeedSource.id == src.id)
+            .execute
+        )
 
-def encode_onnx(texts):
-    """Return embedding vectors using the ONNX model."""
-    if isinstance(texts, str):
-        texts = [texts]
-    inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="np")
-    outputs = session.run(None, dict(inputs))
-    embeddings = outputs[0]
-    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-    norms[norms == 0] = 1
-    embeddings = embeddings / norms
-    return embeddings
+    topic_embeddings.put(key, vector)
+    return vector
 
 
 async def fetch_post_by_identifier(repo: str, rkey: str) -> dict:
@@ -38,72 +78,152 @@ async def fetch_post_by_identifier(repo: str, rkey: str) -> dict:
     return {"uri": uri, "repo": repo, "rkey": rkey}
 
 
-async def fetch_full_post(uri: str) -> dict:
-    """Fetch full post JSON so keyword filters can work."""
-    url = (
-        "https://public.api.bsky.app/xrpc/"
-        "app.bsky.feed.getPosts"
-        f"?uris={uri}"
+async def fetch_posts_batch(uris: list[str]) -> list[dict]:
+    """Fetch up to GET_POSTS_BATCH_SIZE posts with a single getPosts call."""
+    r = await get_client().get(
+        f"{APPVIEW_URL}/xrpc/app.bsky.feed.getPosts",
+        params=[("uris", uri) for uri in uris],
+        timeout=20.0,
     )
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(url)
 
     if r.status_code != 200:
-        return {}
+        print("Post hydration failed:", r.text)
+        return []
+
+    return r.json().get("posts", [])
+
+
+async def hydrate_posts(uris: list[str]) -> dict[str, dict]:
+    """Fetch full post JSON for many URIs, keyed by URI.
+
+    Posts in the local firehose store (if enabled) are served from memory.
+    The rest are grouped into getPosts calls of GET_POSTS_BATCH_SIZE and the
+    batches run concurrently, at most HYDRATION_CONCURRENCY at a time.
+    Posts that could not be fetched are simply missing from the result.
+    """
+    hydrated = post_store.get_many(uris) if post_store is not None else {}
+    missing = [uri for uri in uris if uri not in hydrated]
+
+    batches = [
+        missing[i:i + GET_POSTS_BATCH_SIZE]
+        for i in range(0, len(missing), GET_POSTS_BATCH_SIZE)
+    ]
+    if not batches:
+        return hydrated
+
+    semaphore = asyncio.Semaphore(HYDRATION_CONCURRENCY)
+
+    async def run_batch(batch):
+        async with semaphore:
+            try:
+                return await fetch_posts_batch(batch)
+            except httpx.HTTPError as e:
+                print("Post hydration failed:", e)
+                return []
 
-    posts = r.json().get("posts", [])
-    return posts[0] if posts else {}
+    results = await asyncio.gather(*(run_batch(b) for b in batches))
+
+    for posts in results:
+        for post in posts:
+            uri = post.get("uri")
+            if uri:
+                hydrated[uri] = post
+    return hydrated
 
 
 async def fetch_author_posts(actor_did: str, limit: int = 10) -> list[dict]:
-    """Fetch posts from a Bluesky author DID."""
+    """Fetch posts from a Bluesky author DID.
+
+    With the author index enabled this is served from memory; the network is
+    only hit once per DID, to seed its buffer.
+    """
+    if author_index is not None:
+        uris = author_index.recent(actor_did, limit)
+        if uris is None:
+            uris = await fetch_author_feed(actor_did, author_index.size)
+            # An author with no posts yet stays unseeded and is fetched again
+            if uris:
+                author_index.seed(actor_did, uris)
+                uris = author_index.recent(actor_did, limit)
+    else:
+        uris = await fetch_author_feed(actor_did, limit)
+
+    results = []
+    for uri in uris:
+        try:
+            _, _, repo, _, rkey = uri.split("/", 4)
+        except ValueError:
+            continue
+
+        results.append(await fetch_post_by_identifier(repo, rkey))
+
+    return results
+
+
+async def fetch_author_feed(actor_did: str, limit: int) -> list[str]:
+    """Post URIs from app.bsky.feed.getAuthorFeed, newest first."""
     url = (
-        "https://public.api.bsky.app/xrpc/"
+        f"{APPVIEW_URL}/xrpc/"
         "app.bsky.feed.getAuthorFeed"
-        f"?actor={actor_did}&limit={limit}"
+        f"?actor={actor_did}&limit={min(limit, MAX_SOURCE_FETCH_LIMIT)}"
     )
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.get(url)
+    r = await get_client().get(url, timeout=30.0)
 
     if r.status_code != 200:
         print("Author fetch failed:", r.text)
-        return []
+        r.raise_for_status()
 
     items = r.json().get("feed", [])
-    results = []
+    uris = []
 
     for item in items:
         post = item.get("post")
         if not post:
             continue
         uri = post.get("uri")
-        if not uri:
-            continue
-        try:
-            _, _, repo, _, rkey = uri.split("/", 4)
-        except ValueError:
-            continue
+        if uri:
+            uris.append(uri)
 
-        results.append(await fetch_post_by_identifier(repo, rkey))
+    return uris
 
-    return results
+
+def routed_posts(feed_uri: str, limit: int) -> list[dict]:
+    """Newest posts the firehose router matched to this feed (see server.router)."""
+    rows = (
+        FeedCandidate
+        .select(FeedCandidate.uri)
+        .where(FeedCandidate.feed_uri == feed_uri)
+        .order_by(FeedCandidate.indexed_at.desc())
+        .limit(limit)
+    )
+    return [{"uri": row.uri} for row in rows]
 
 
-async def search_topics(query: str, limit: int = 10) -> list[dict]:
-    """Use vector search to find relevant posts, returning minimal identifiers."""
-    vector = encode_onnx(query).tolist()[0][0]
-    body = json.dumps(vector)
+async def search_topics(query: str, limit: int = 10, vector=None) -> list[dict]:
+    """Use vector search to find relevant posts, returning minimal identifiers.
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r_vector = await client.post(
-            f"{CUSTOM_API_URL}/vector/search/posts",
-            content=body,
-            headers={"Content-Type": "application/json"}
-        )
+    Pass a precomputed `vector` to skip encoding the query. Uses the local
+    vector index when enabled, otherwise CUSTOM_API_URL.
+    """
+    if vector is None:
+        vector = (await encode_async(query))[0]
+
+    if vector_index is not None:
+        matches = await vector_index.search_async(vector, limit)
+        return [{"uri": uri} for uri, _ in matches]
+
+    body = json.dumps(vector.tolist())
+
+    r_vector = await get_client().post(
+        f"{CUSTOM_API_URL}/vector/search/posts",
+        content=body,
+        headers={"Content-Type": "application/json"},
+        timeout=30.0,
+    )
 
     if r_vector.status_code != 200:
         print("Vector search failed:", r_vector.text)
-        return []
+        r_vector.raise_for_status()
 
     results = []
     for post in r_vector.json()[:limit]:
@@ -115,139 +235,192 @@ async def search_topics(query: str, limit: int = 10) -> list[dict]:
     return results
 
 
-# Filtering logic (blacklist plcs + keywords)
-def extract_filters(feed_uri: str):
-    """Return sets for quick filtering."""
-    rows = (
-        FeedSource
-        .select()
-        .where(FeedSource.feed == Feed.get(Feed.uri == feed_uri))
-    )
-    blocked_dids = set()
-    banned_keywords = set()
-    for r in rows:
-        if r.source_type == "account_filter":
-            blocked_dids.add(r.identifier)
-        if r.source_type == "topic_filter":
-            banned_keywords.add(r.identifier.lower())
-
-    return blocked_dids, banned_keywords
-
-def should_block_post(full_post: dict, blocked_dids: set, banned_keywords: set) -> bool:
+def should_block_post(full_post: dict, post_filter: CompiledFilter) -> bool:
     """Return True if post should be filtered out."""
-    # Block authors
-    author = full_post.get("author")
-    if author:
-        if author.get("did") in blocked_dids:
-            return True
-    # Block keyword-containing posts
-    record = full_post.get("record", {})
-    text = record.get("text", "").lower()
+    return post_filter.blocks(full_post)
 
-    for kw in banned_keywords:
-        if kw in text:
-            return True
 
-    return False
+def post_sort_key(full_post: dict) -> str:
+    """Rank newer posts first; ISO-8601 UTC timestamps sort as strings."""
+    return full_post.get("indexedAt") or full_post.get("record", {}).get("createdAt", "")
 
 
 # Feed handler factory
 def make_handler(feed_uri: str):
-    async def build_feed(limit=10):
-        """Build fresh feed skeleton by fetching sources + posts."""
-        sources = (
-            FeedSource
-            .select()
-            .join(Feed)
-            .where(Feed.uri == feed_uri)
+    # At most one build per feed; concurrent requests share it
+    flight = SingleFlight(f"build {feed_uri}", timeout=config.FEED_BUILD_TIMEOUT)
+    # Read by the refresh scheduler to prioritize busy feeds
+    requests = RequestRate()
+    cache_hit = metrics.feed_cache_requests.labels(feed_uri, "hit")
+    cache_stale = metrics.feed_cache_requests.labels(feed_uri, "stale")
+    cache_miss = metrics.feed_cache_requests.labels(feed_uri, "miss")
+
+    async def build_feed():
+        """Build and cache a ranked list of up to CANDIDATE_DEPTH post URIs."""
+        started = time.perf_counter()
+        sources = await run_read(
+            lambda: list(
+                FeedSource
+                .select()
+                .join(Feed)
+                .where(Feed.uri == feed_uri)
+            )
         )
 
-        # Load blacklist rules
-        blocked_dids, banned_keywords = extract_filters(feed_uri)
+        # Load blacklist rules (compiled once, until the feed's sources change)
+        post_filter = cached_filter(feed_uri) or await run_read(compile_filter, feed_uri)
 
-        collected = []
+        # Spread the candidate budget over the preference sources
+        preference_count = sum(
+            src.source_type in ("account_preference", "topic_preference") for src in sources
+        )
+        fetch_limit = min(
+            MAX_SOURCE_FETCH_LIMIT,
+            max(10, -(-CANDIDATE_DEPTH // max(preference_count, 1))),
+        )
+
+        # Fetch all preference sources concurrently, capped per feed
+        semaphore = asyncio.Semaphore(config.FEED_SOURCE_CONCURRENCY)
 
-        for src in sources:
-            # Preferences
-            if src.source_type == "account_preference":
-                collected.extend(await fetch_author_posts(src.identifier, limit))
+        async def fetch_source(src):
+            async with semaphore:
+                # Preferences
+                if src.source_type == "account_preference":
+                    return await fetch_author_posts(src.identifier, fetch_limit)
 
-            elif src.source_type == "topic_preference":
-                collected.extend(await search_topics(src.identifier, limit=limit))
+                elif src.source_type == "topic_preference":
+                    return await search_topics(
+                        src.identifier, limit=fetch_limit, vector=await topic_embedding(src)
+                    )
 
-            # Filters NOT fetched here — they are applied to results below.
+                # Filters NOT fetched here — they are applied to results below.
+                return []
+
+        routed, *results = await asyncio.gather(
+            run_read(routed_posts, feed_uri, CANDIDATE_DEPTH),
+            *(fetch_source(src) for src in sources),
+            return_exceptions=True,
+        )
+
+        # A failing source only drops its own posts, not the whole build
+        collected = []
+        if isinstance(routed, Exception):
+            print("Routed candidates failed:", routed)
+        else:
+            collected.extend(routed)
+        failed = 0
+        for src, result in zip(sources, results):
+            if isinstance(result, Exception):
+                print(f"Source fetch failed ({src.source_type} {src.identifier}):", result)
+                failed += 1
+                continue
+            collected.extend(result)
+
+        # ...but if every source failed, upstream is down: keep the last good feed
+        if preference_count and failed == preference_count:
+            raise FeedBuildError(f"all {failed} sources failed")
 
         # Deduplicate
         seen = set()
-        filtered_posts = []
-
-        # Apply filters
+        candidate_uris = []
         for p in collected:
             uri = p["uri"]
             if uri in seen:
                 continue
             seen.add(uri)
+            candidate_uris.append(uri)
+
+        fetched = time.perf_counter()
+        metrics.feed_build_seconds.labels("sources").observe(fetched - started)
+
+        # Hydrate all candidates in batched getPosts calls
+        full_posts = await hydrate_posts(candidate_uris)
+        if candidate_uris and not full_posts:
+            raise FeedBuildError(f"none of {len(candidate_uris)} candidates could be hydrated")
+        hydrated = time.perf_counter()
+        metrics.feed_build_seconds.labels("hydrate").observe(hydrated - fetched)
 
-            full_post = await fetch_full_post(uri)
+        # Apply filters
+        kept = []
+        for uri in candidate_uris:
+            full_post = full_posts.get(uri)
             if not full_post:
                 continue
 
             # apply filters
-            if should_block_post(full_post, blocked_dids, banned_keywords):
+            if should_block_post(full_post, post_filter):
                 continue
 
-            filtered_posts.append(p)
+            kept.append(full_post)
 
-            if len(filtered_posts) >= limit:
-                break
+        # Rank
+        kept.sort(key=post_sort_key, reverse=True)
+        ranked_uris = [post["uri"] for post in kept[:CANDIDATE_DEPTH]]
+        metrics.feed_build_seconds.labels("filter").observe(time.perf_counter() - hydrated)
 
-        # Format for Bluesky
-        feed = {
-            "cursor": str(int(time.time())),
-            "feed": [{"post": p["uri"]} for p in filtered_posts[:limit]]
-        }
+        built_at = int(time.time())
+        entry = response_cache.put(feed_uri, ranked_uris, built_at)
 
-        # Save to SQLite
-        FeedCache.insert(
-            feed_uri=feed_uri,
-            response_json=json.dumps(feed),
-            timestamp=int(time.time())
-        ).on_conflict_replace().execute()
+        # Save to SQLite for warm restarts
+        await run_write(
+            FeedCache.insert(
+                feed_uri=feed_uri,
+                response_json=json.dumps({"feed": [{"post": uri} for uri in ranked_uris]}),
+                timestamp=built_at
+            ).on_conflict_replace().execute
+        )
 
-        return feed
+        metrics.feed_build_seconds.labels("total").observe(time.perf_counter() - started)
+        return entry
 
-    async def serve_from_cache(limit=10):
-        """Return cached feed if recent, otherwise None."""
-        row = FeedCache.get_or_none(FeedCache.feed_uri == feed_uri)
+    async def serve_from_cache():
+        """Return the cached candidates, from memory or else from SQLite, or None."""
+        entry = response_cache.get(feed_uri)
+        if entry is not None:
+            return entry
+
+        # Second tier: persisted candidates, e.g. after a restart
+        row = await run_read(FeedCache.get_or_none, FeedCache.feed_uri == feed_uri)
         if row is None:
             return None
+        uris = [item["post"] for item in json.loads(row.response_json).get("feed", [])]
+        return response_cache.put(feed_uri, uris, row.timestamp)
 
-        age = time.time() - row.timestamp
-        if age < CACHE_TTL:
-            return json.loads(row.response_json)
+    def background_refresh():
+        """Refresh cache in the background unless a build is already running."""
+        flight.start(build_feed)
 
-        return json.loads(row.response_json)  # stale but still valid
+    async def handler(cursor=None, limit=20):
+        """Return one page of the feed skeleton as JSON bytes.
 
-    async def background_refresh(limit=10):
-        """Refresh cache in the background (non-blocking)."""
-        try:
-            await build_feed(limit)
-        except Exception as e:
-            print("Background refresh failed:", e)
+        Raises ValueError for a malformed cursor, and FeedBuildError if
+        there is no cached feed and building one failed.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_LIMIT))
+        requests.hit()
 
-    async def handler(cursor="", limit=10):
         # Try cached version first
-        cached = await serve_from_cache(limit)
+        cached = await serve_from_cache()
 
-        if cached:
+        if cached is not None:
             # If cached but stale then refresh in background
-            row = FeedCache.get_or_none(FeedCache.feed_uri == feed_uri)
-            if time.time() - row.timestamp >= CACHE_TTL:
-                asyncio.create_task(background_refresh(limit))
-            return cached
-
-        # If there's no cache build immediately
-        fresh = await build_feed(limit)
-        return fresh
-
+            if time.time() - cached.built_at >= CACHE_TTL:
+                cache_stale.inc()
+                background_refresh()
+            else:
+                cache_hit.inc()
+        else:
+            # If there's no cache build immediately (or join the one running)
+            cache_miss.inc()
+            cached = await flight.wait(build_feed)
+
+        return cached.page(cursor, limit)
+
+    async def refresh():
+        """Rebuild now (or join the running build); used by the scheduler."""
+        return await flight.wait(build_feed)
+
+    handler.flight = flight
+    handler.requests = requests
+    handler.refresh = refresh
     return handler
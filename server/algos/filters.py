@@ -0,0 +1,173 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from server import config
+from server.models import Feed, FeedSource
+
+try:
+    # Optional C implementation (pip install pyahocorasick)
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class _PyAutomaton:
+    """Pure-Python Aho-Corasick automaton; used when pyahocorasick is missing."""
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # lengths of keywords ending at each state
+
+        for kw in keywords:
+            state = 0
+            for c in kw:
+                nxt = self._goto[state].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][c] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(len(kw))
+
+        # Breadth-first pass to fill in failure links; depth-1 states fail to the root
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter(self, text: str):
+        """Yield (end_index, keyword_length) for every match in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, c in enumerate(text):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            for length in out[state]:
+                yield i, length
+
+
+class KeywordMatcher:
+    """Match many keywords against a text in one pass (Aho-Corasick).
+
+    Keywords and text are compared lowercased. With `word_boundary`, a match
+    counts only if it isn't part of a longer word, so "ai" doesn't match
+    "said".
+    """
+
+    def __init__(self, keywords, word_boundary: bool = True):
+        self.keywords = frozenset(kw.lower() for kw in keywords if kw)
+        self.word_boundary = word_boundary
+
+        if not self.keywords:
+            self._automaton = None
+        elif ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for kw in self.keywords:
+                automaton.add_word(kw, len(kw))
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            self._automaton = _PyAutomaton(self.keywords)
+
+    def search(self, text: str) -> bool:
+        """Return True if any keyword occurs in text."""
+        if self._automaton is None or not text:
+            return False
+        text = text.lower()
+        for end, length in self._automaton.iter(text):
+            if not self.word_boundary:
+                return True
+            start = end - length + 1
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end + 1 < len(text) and _is_word_char(text[end + 1]):
+                continue
+            return True
+        return False
+
+
+@dataclass(frozen=True)
+class CompiledFilter:
+    """A feed's blocked authors and keywords, ready to apply to posts."""
+
+    blocked_dids: frozenset
+    keywords: KeywordMatcher
+
+    def blocks(self, full_post: dict) -> bool:
+        """Return True if post should be filtered out."""
+        # Block authors
+        author = full_post.get("author")
+        if author and author.get("did") in self.blocked_dids:
+            return True
+        # Block keyword-containing posts
+        text = full_post.get("record", {}).get("text", "")
+        return self.keywords.search(text)
+
+
+# Filtering logic (blacklist plcs + keywords)
+def extract_filters(feed_uri: str):
+    """Return sets for quick filtering."""
+    rows = (
+        FeedSource
+        .select()
+        .where(FeedSource.feed == Feed.get(Feed.uri == feed_uri))
+    )
+    blocked_dids = set()
+    banned_keywords = set()
+    for r in rows:
+        if r.source_type == "account_filter":
+            blocked_dids.add(r.identifier)
+        if r.source_type == "topic_filter":
+            banned_keywords.add(r.identifier.lower())
+
+    return blocked_dids, banned_keywords
+
+
+_compiled = {}
+# Bumped on invalidation so a compile that raced with it isn't cached
+_generations = {}
+_lock = threading.Lock()
+
+
+def cached_filter(feed_uri: str):
+    """Return the compiled filter for a feed if it is already in memory."""
+    return _compiled.get(feed_uri)
+
+
+def compile_filter(feed_uri: str) -> CompiledFilter:
+    """Load a feed's filters from the database, compile and cache them.
+
+    Blocking; call through storage.run_read from async code.
+    """
+    generation = _generations.get(feed_uri, 0)
+    blocked_dids, banned_keywords = extract_filters(feed_uri)
+    compiled = CompiledFilter(
+        frozenset(blocked_dids),
+        KeywordMatcher(banned_keywords, word_boundary=config.FILTER_WORD_BOUNDARY),
+    )
+    with _lock:
+        if _generations.get(feed_uri, 0) == generation:
+            _compiled[feed_uri] = compiled
+    return compiled
+
+
+def invalidate_filter(feed_uri: str) -> None:
+    """Drop a feed's compiled filter after its sources change."""
+    with _lock:
+        _generations[feed_uri] = _generations.get(feed_uri, 0) + 1
+        _compiled.pop(feed_uri, None)
@@ -0,0 +1,107 @@
+import base64
+import json
+from collections import OrderedDict
+
+from server import config
+
+# Pages memoized per feed (first pages of common limits are the hot ones)
+MAX_MEMOIZED_PAGES = 8
+
+
+def encode_cursor(offset: int, last_uri: str) -> str:
+    """Opaque cursor: the position reached and the last URI served there."""
+    raw = f"{offset}|{last_uri}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        offset, last_uri = raw.split("|", 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed cursor: {cursor!r}") from e
+    if offset < 0:
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    return offset, last_uri
+
+
+class CachedFeed:
+    """One build's ranked candidate URIs; pages are slices of it."""
+
+    def __init__(self, uris: list[str], built_at: float):
+        self.uris = tuple(uris)
+        self.built_at = built_at
+        self._positions = {uri: i for i, uri in enumerate(self.uris)}
+        self._pages = {}
+        self.size = sum(len(uri) for uri in self.uris)
+
+    def _start(self, cursor: str) -> int:
+        if not cursor:
+            return 0
+        offset, last_uri = decode_cursor(cursor)
+        # Resume after the last URI served, even if a refresh moved it;
+        # fall back to the raw offset if it has since dropped out.
+        position = self._positions.get(last_uri)
+        return position + 1 if position is not None else offset
+
+    def page(self, cursor: str, limit: int) -> bytes:
+        """Serialized getFeedSkeleton response for one page."""
+        start = self._start(cursor)
+        key = (start, limit)
+        body = self._pages.get(key)
+        if body is not None:
+            return body
+
+        uris = self.uris[start:start + limit]
+        response = {"feed": [{"post": uri} for uri in uris]}
+        end = start + len(uris)
+        if uris and end < len(self.uris):
+            response["cursor"] = encode_cursor(end, uris[-1])
+
+        body = json.dumps(response).encode()
+        if len(self._pages) < MAX_MEMOIZED_PAGES:
+            self._pages[key] = body
+            self.size += len(body)
+        return body
+
+
+class ResponseCache:
+    """In-memory LRU of ranked feed candidates, keyed by feed URI.
+
+    Bounded by the approximate memory of the stored URIs and memoized pages.
+    Only touched from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+
+    def get(self, feed_uri: str):
+        entry = self._entries.get(feed_uri)
+        if entry is not None:
+            self._entries.move_to_end(feed_uri)
+        return entry
+
+    def put(self, feed_uri: str, uris: list[str], built_at: float) -> CachedFeed:
+        entry = CachedFeed(uris, built_at)
+        self._entries[feed_uri] = entry
+        self._entries.move_to_end(feed_uri)
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        size = sum(e.size for e in self._entries.values())
+        while size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            size -= evicted.size
+
+    def invalidate(self, feed_uri: str) -> None:
+        self._entries.pop(feed_uri, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,140 @@
+import asyncio
+import math
+import random
+import time
+
+from server.logger import logger
+
+# Request rate half-life used for priority (seconds)
+RATE_HALF_LIFE = 600
+# Feeds requested at least this often (requests/sec) are kept fresh;
+# 1/60 is one request a minute
+ACTIVE_RATE = 1 / 60
+# Below this the feed is idle and the scheduler stops refreshing it;
+# requests still refresh it on demand
+IDLE_RATE = 1e-4
+# Refresh active feeds this far into their TTL, before they go stale
+REFRESH_AT = 0.8
+# +/- fraction of random jitter applied to every interval
+JITTER = 0.1
+# Seconds between scheduler passes
+TICK = 1.0
+
+
+class RequestRate:
+    """Exponentially decayed request rate, in requests per second."""
+
+    def __init__(self, half_life: float = RATE_HALF_LIFE):
+        self.half_life = half_life
+        self._rate = 0.0
+        self._updated = time.monotonic()
+
+    def _decay(self, now: float) -> None:
+        self._rate *= 0.5 ** ((now - self._updated) / self.half_life)
+        self._updated = now
+
+    def hit(self) -> None:
+        self._decay(time.monotonic())
+        # scaled so that a steady r requests/sec converges to r
+        self._rate += math.log(2) / self.half_life
+
+    def rate(self) -> float:
+        self._decay(time.monotonic())
+        return self._rate
+
+
+class _FeedState:
+    def __init__(self, next_due: float):
+        self.next_due = next_due
+        self.failures = 0
+
+
+def _jittered(seconds: float) -> float:
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class RefreshScheduler:
+    """Refresh feeds from the `algos` registry before they go stale.
+
+    Each pass picks the feeds that are due, busiest first, and starts as
+    many builds as the global budget allows. Builds already running because
+    of requests count against the budget. Active feeds refresh at REFRESH_AT
+    of their TTL; low-traffic feeds at `idle_interval`; idle feeds not at
+    all. Feeds whose builds fail back off exponentially up to `max_backoff`.
+    """
+
+    def __init__(self, registry: dict, ttl: float, concurrency: int,
+                 idle_interval: float, max_backoff: float):
+        self.registry = registry
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self._states = {}
+        self._tasks = set()
+
+    def _interval(self, rate: float) -> float:
+        if rate >= ACTIVE_RATE:
+            return self.ttl * REFRESH_AT
+        return self.idle_interval
+
+    async def run(self) -> None:
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Refresh scheduler pass failed: {e}")
+            await asyncio.sleep(TICK)
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        due = []
+        for uri, handler in list(self.registry.items()):
+            state = self._states.get(uri)
+            if state is None:
+                # spread first refreshes out so feeds don't move in lockstep
+                state = self._states[uri] = _FeedState(now + random.uniform(0, self.ttl))
+            if state.next_due <= now and not handler.flight.in_flight:
+                due.append((handler.requests.rate(), uri, handler))
+
+        # drop state for feeds no longer registered
+        for uri in self._states.keys() - self.registry.keys():
+            del self._states[uri]
+
+        running = sum(handler.flight.in_flight for handler in self.registry.values())
+        slots = self.concurrency - running
+
+        due.sort(key=lambda item: item[0], reverse=True)
+        for rate, uri, handler in due:
+            state = self._states[uri]
+            if rate < IDLE_RATE:
+                # nobody is reading it; check again later without a build
+                state.next_due = now + _jittered(self.idle_interval)
+                continue
+            if slots <= 0:
+                break
+            slots -= 1
+            task = asyncio.create_task(self._refresh(uri, handler, rate))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, uri: str, handler, rate: float) -> None:
+        state = self._states.setdefault(uri, _FeedState(0))
+        try:
+            await handler.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # already logged by the handler's SingleFlight
+            state.failures += 1
+            delay = min(self.max_backoff, self.ttl * 2 ** state.failures)
+            logger.warning(f"Refresh of {uri} failed {state.failures} time(s) in a row, "
+                           f"backing off {delay:.0f}s")
+        else:
+            state.failures = 0
+            delay = self._interval(rate)
+        state.next_due = time.monotonic() + _jittered(delay)
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
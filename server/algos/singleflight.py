@@ -0,0 +1,65 @@
+import asyncio
+
+from server.logger import logger
+
+
+class SingleFlight:
+    """Run at most one instance of an async job at a time.
+
+    Callers that arrive while the job is running share the in-flight task
+    instead of starting another. The task is referenced here until it
+    finishes, so it cannot be garbage-collected mid-flight.
+    """
+
+    def __init__(self, name: str, timeout: float = None):
+        self.name = name
+        self.timeout = timeout
+        self._task = None
+        self.started = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    @property
+    def in_flight(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, job) -> asyncio.Task:
+        """Return the running task, or start `job()` if nothing is running."""
+        if self.in_flight:
+            self.coalesced += 1
+            return self._task
+
+        self.started += 1
+        self._task = asyncio.create_task(self._run(job))
+        # failures are logged in _run; mark them retrieved for fire-and-forget callers
+        self._task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._task
+
+    async def _run(self, job):
+        try:
+            if self.timeout is None:
+                return await job()
+            return await asyncio.wait_for(job(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.error(f"{self.name}: timed out after {self.timeout}s")
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"{self.name}: failed: {e}")
+            raise
+
+    async def wait(self, job):
+        """Start or join the job and wait for its result.
+
+        Cancelling the caller (e.g. a client disconnect) doesn't cancel the
+        shared task other callers may be waiting on.
+        """
+        return await asyncio.shield(self.start(job))
+
+    def cancel(self) -> None:
+        if self.in_flight:
+            self._task.cancel()
@@ -1,16 +1,20 @@
 import sys
+import asyncio
 import signal
 import threading
 import logging
 import os
+import datetime
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
-
-from server import config, data_stream
-from server.algos import algos
-from server.algos.feed import make_handler
-from server.data_filter import operations_callback
+from fastapi.responses import JSONResponse, Response
+
+from server import config, data_stream, metrics, retention
+from server.http_client import close_client
+from server.algos import algos, encoder
+from server.algos.feed import make_handler, CACHE_TTL, FeedBuildError
+from server.algos.scheduler import RefreshScheduler
+from server.data_filter import operations_callback, INTERESTED_COLLECTIONS
 from server.create_feed import create_feed
 from server.models import Feed
 
@@ -23,8 +27,22 @@ logging.basicConfig(level=logging.INFO)
 stream_stop_event = threading.Event()
 stream_thread = threading.Thread(
     target=data_stream.run,
-    args=(config.SERVICE_DID, operations_callback, stream_stop_event),
+    args=(config.SERVICE_DID, operations_callback, stream_stop_event, config.FIREHOSE_WORKERS, INTERESTED_COLLECTIONS),
+    kwargs={'queue_size': config.FIREHOSE_QUEUE_SIZE, 'overflow_policy': config.FIREHOSE_OVERFLOW_POLICY},
+)
+retention_thread = threading.Thread(
+    target=retention.run,
+    args=(datetime.timedelta(hours=config.POST_RETENTION_HOURS), config.RETENTION_INTERVAL, stream_stop_event),
+    daemon=True,
 )
+refresh_scheduler = RefreshScheduler(
+    algos,
+    ttl=CACHE_TTL,
+    concurrency=config.FEED_SCHEDULER_CONCURRENCY,
+    idle_interval=config.FEED_IDLE_REFRESH_INTERVAL,
+    max_backoff=config.FEED_REFRESH_MAX_BACKOFF,
+)
+refresh_scheduler_task = None
 
 def sigint_handler(*_):
     logging.info("SIGINT received, stopping...")
@@ -39,6 +57,21 @@ async def start_stream():
     stream_thread.start()
     logging.info("Data stream started.")
 
+@app.on_event("startup")
+async def start_retention():
+    retention_thread.start()
+
+@app.on_event("startup")
+async def start_refresh_scheduler():
+    global refresh_scheduler_task
+    if config.FEED_SCHEDULER_ENABLED:
+        refresh_scheduler_task = asyncio.create_task(refresh_scheduler.run())
+
+@app.on_event("startup")
+async def warm_up_encoder():
+    if config.EMBEDDING_WARMUP:
+        encoder.warm_up_in_background()
+
 @app.on_event("shutdown")
 async def stop_stream():
     logging.info("Stopping data stream...")
@@ -46,11 +79,36 @@ async def stop_stream():
     stream_thread.join()
     logging.info("Data stream stopped.")
 
+@app.on_event("shutdown")
+async def cancel_feed_builds():
+    if refresh_scheduler_task:
+        refresh_scheduler_task.cancel()
+        refresh_scheduler.stop()
+    for handler in algos.values():
+        handler.flight.cancel()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await close_client()
+    logging.info("HTTP client closed.")
+
 # Routes
 @app.get("/")
 async def index():
     return "ATProto Feed Generator powered by The AT Protocol SDK for Python (https://github.com/MarshalX/atproto)."
 
+@app.get("/ready")
+async def ready():
+    # Only a startup warm-up holds readiness back; with EMBEDDING_WARMUP off
+    # (or after a failed warm-up) the model loads lazily on first use
+    if encoder.is_warming():
+        return JSONResponse({"ready": False}, status_code=503)
+    return {"ready": True, "model_loaded": encoder.is_ready()}
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/.well-known/did.json")
 async def did_json():
     if not config.SERVICE_DID.endswith(config.HOSTNAME):
@@ -88,8 +146,13 @@ async def get_feed_skeleton(feed: str, cursor: str = None, limit: int = 20):
         body = await algo(cursor, limit)
     except ValueError:
         raise HTTPException(status_code=400, detail="Malformed cursor")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Feed build timed out")
+    except FeedBuildError:
+        raise HTTPException(status_code=503, detail="Feed sources unavailable")
     
-    return body
+    # Handlers return pre-serialized JSON, so skip FastAPI's encoder
+    return Response(content=body, media_type="application/json")
 
 @app.post("/manage-feed")
 async def create_feed_endpoint(request: Request, data: dict):
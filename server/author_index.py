@@ -0,0 +1,90 @@
+import threading
+from collections import deque
+
+from server import config
+
+
+class AuthorIndex:
+    """Most recent post URIs for each account that some feed follows.
+
+    The firehose consumer calls add()/delete() for every post; only DIDs in
+    the tracked set (account_preference sources across all feeds) are kept,
+    each in a ring buffer of `size` URIs, newest first. A DID's buffer is
+    seeded once from the network (seed()) and then kept current by the
+    firehose, so recent() can answer without an HTTP call.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tracked = frozenset()
+        self._buffers = {}
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    def track(self, dids) -> None:
+        """Replace the set of tracked DIDs, dropping buffers for the rest."""
+        tracked = frozenset(dids)
+        with self._lock:
+            for did in list(self._buffers):
+                if did not in tracked:
+                    del self._buffers[did]
+                    self._seeded.discard(did)
+            self._tracked = tracked
+
+    def add(self, did: str, uri: str) -> None:
+        if did not in self._tracked:
+            return
+        with self._lock:
+            buffer = self._buffers.get(did)
+            if buffer is None:
+                buffer = self._buffers[did] = deque(maxlen=self.size)
+            buffer.appendleft(uri)
+
+    def delete(self, uri: str) -> None:
+        did = uri[len('at://'):].split('/', 1)[0]
+        if did not in self._tracked:
+            return
+        with self._lock:
+            buffer = self._buffers.get(did)
+            if buffer is not None and uri in buffer:
+                buffer.remove(uri)
+
+    def seed(self, did: str, uris: list[str]) -> None:
+        """Fill a DID's buffer from a network fetch (newest first).
+
+        Posts that arrived on the firehose in the meantime stay in front.
+        """
+        with self._lock:
+            live = self._buffers.get(did, ())
+            merged = deque(live, maxlen=self.size)
+            merged.extend(uri for uri in uris if uri not in live)
+            self._buffers[did] = merged
+            self._seeded.add(did)
+            if did not in self._tracked:
+                self._tracked = self._tracked | {did}
+
+    def recent(self, did: str, limit: int):
+        """Newest `limit` URIs for a seeded DID, or None if it needs seeding."""
+        with self._lock:
+            if did not in self._seeded:
+                return None
+            buffer = self._buffers.get(did, ())
+            return [uri for _, uri in zip(range(limit), buffer)]
+
+
+def track_account_sources() -> None:
+    """Track every account_preference DID currently in the feeds database."""
+    if author_index is None:
+        return
+    from server.models import FeedSource
+
+    author_index.track(
+        src.identifier
+        for src in FeedSource.select(FeedSource.identifier)
+        .where(FeedSource.source_type == 'account_preference')
+    )
+
+
+author_index = None
+if config.AUTHOR_INDEX:
+    author_index = AuthorIndex(config.AUTHOR_INDEX_SIZE)
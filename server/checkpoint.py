@@ -0,0 +1,100 @@
+import threading
+import time
+
+from atproto import models
+
+from server.database import db, SubscriptionState
+from server.logger import logger
+from server.write_buffer import post_buffer
+
+# Save the cursor at least this often (seconds)...
+CHECKPOINT_INTERVAL = 5.0
+# ...and sooner once this many events have been processed since the last save
+CHECKPOINT_EVENTS = 5000
+
+
+class Checkpointer:
+    """Persist the firehose cursor from a background thread.
+
+    The consumer calls advance(seq) after an event is fully processed and
+    observe(seq) as events arrive; both are plain attribute writes, so they
+    are cheap on the hot path. A background thread saves the last processed
+    seq every CHECKPOINT_INTERVAL seconds or CHECKPOINT_EVENTS events, after
+    flushing buffered post writes in the same transaction.
+    """
+
+    def __init__(self, service: str, interval: float = CHECKPOINT_INTERVAL, every_events: int = CHECKPOINT_EVENTS):
+        self.service = service
+        self.interval = interval
+        self.every_events = every_events
+        self.client = None
+
+        self.processed_seq = None
+        self.live_seq = None
+        self.saved_seq = None
+        self.saved_at = None
+
+        self._events = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='firehose-checkpoint', daemon=True)
+
+    @property
+    def lag(self):
+        """Events between the saved cursor and the newest seq received."""
+        if self.live_seq is None or self.saved_seq is None:
+            return None
+        return self.live_seq - self.saved_seq
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def observe(self, seq: int) -> None:
+        self.live_seq = seq
+
+    def advance(self, seq: int) -> None:
+        self.processed_seq = seq
+        self._events += 1
+        if self._events >= self.every_events:
+            self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f'Failed to checkpoint cursor for {self.service}: {e}')
+
+    def save(self) -> None:
+        seq = self.processed_seq
+        if seq is None or seq == self.saved_seq:
+            return
+        self._events = 0
+
+        # Buffered posts up to `seq` are committed in the same transaction,
+        # so a stored cursor never runs ahead of the data. If either write
+        # fails nothing is saved and the posts go back into the buffer.
+        batch = None
+        try:
+            with db.atomic():
+                batch = post_buffer.flush()
+                SubscriptionState.update(cursor=seq).where(SubscriptionState.service == self.service).execute()
+        except Exception:
+            post_buffer.requeue(batch)
+            raise
+
+        if self.client is not None:
+            self.client.update_params(models.ComAtprotoSyncSubscribeRepos.Params(cursor=seq))
+
+        self.saved_seq = seq
+        self.saved_at = time.time()
+        logger.debug(f'Checkpointed cursor for {self.service} at {seq} (lag {self.lag} events)')
+
+    def stop(self) -> None:
+        """Stop the background thread and save the final position."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self.save()
@@ -27,3 +27,110 @@ IGNORE_REPLY_POSTS = _get_bool_env_var(os.environ.get("IGNORE_REPLY_POSTS"))
 SHOW_DEBUG_LOGS = _get_bool_env_var(os.environ.get("SHOW_DEBUG_LOGS"))
 if SHOW_DEBUG_LOGS:
     logger.setLevel(logging.DEBUG)
+
+# Shared upstream HTTP client
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 30))
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+HTTP2_ENABLED = _get_bool_env_var(os.environ.get("HTTP2_ENABLED"))
+
+# Bluesky AppView used for getAuthorFeed / getPosts (override to point at a
+# mirror or at the local stubs in benchmarks.upstream_stubs)
+BSKY_APPVIEW_URL = os.environ.get("BSKY_APPVIEW_URL", "https://public.api.bsky.app").rstrip("/")
+
+# Maximum number of feed sources fetched concurrently while building one feed
+FEED_SOURCE_CONCURRENCY = int(os.environ.get("FEED_SOURCE_CONCURRENCY", 8))
+
+# Number of topic embeddings kept in the in-process LRU
+TOPIC_EMBEDDING_CACHE_SIZE = int(os.environ.get("TOPIC_EMBEDDING_CACHE_SIZE", 4096))
+
+# Embedding model (ONNX Runtime) session tuning. Thread counts of 0 let
+# ONNX Runtime decide; with several uvicorn workers, set INTRA_OP_THREADS
+# to roughly cores / workers to avoid oversubscription.
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", 0))
+ONNX_INTER_OP_THREADS = int(os.environ.get("ONNX_INTER_OP_THREADS", 0))
+ONNX_GRAPH_OPTIMIZATION_LEVEL = os.environ.get("ONNX_GRAPH_OPTIMIZATION_LEVEL", "all")  # disable|basic|extended|all
+ONNX_ENABLE_CPU_MEM_ARENA = _get_bool_env_var(os.environ.get("ONNX_ENABLE_CPU_MEM_ARENA", "true"))
+ONNX_ENABLE_MEM_PATTERN = _get_bool_env_var(os.environ.get("ONNX_ENABLE_MEM_PATTERN", "true"))
+
+# Embedding model variant: "fp32" (default) or "int8" (dynamic quantization,
+# generated from the fp32 model on first use and needs the "onnx" package;
+# see benchmarks/quantization_benchmark.py)
+EMBEDDING_MODEL_VARIANT = os.environ.get("EMBEDDING_MODEL_VARIANT", "fp32")
+
+# Load the embedding model in the background at startup instead of on first use
+EMBEDDING_WARMUP = _get_bool_env_var(os.environ.get("EMBEDDING_WARMUP", "true"))
+
+# Number of worker processes decoding firehose commits. 0 decodes inline on
+# the receive thread.
+FIREHOSE_WORKERS = int(os.environ.get("FIREHOSE_WORKERS", 0))
+
+# Frames buffered between the firehose socket and processing (0 processes
+# on the socket thread). When full, FIREHOSE_OVERFLOW_POLICY decides:
+# 'block' waits for room, 'drop' discards frames with no post ops, and
+# 'spill' appends frames to FIREHOSE_SPILL_PATH until processing catches up.
+FIREHOSE_QUEUE_SIZE = int(os.environ.get("FIREHOSE_QUEUE_SIZE", 10_000))
+FIREHOSE_OVERFLOW_POLICY = os.environ.get("FIREHOSE_OVERFLOW_POLICY", "block").strip().lower()
+FIREHOSE_SPILL_PATH = os.environ.get("FIREHOSE_SPILL_PATH", "firehose_spill.frames")
+
+# Append every raw firehose frame to this file (gzip if it ends in .gz), for
+# offline replay with benchmarks.ingest_benchmark --frames. Unset to disable.
+FIREHOSE_RECORD_PATH = os.environ.get("FIREHOSE_RECORD_PATH")
+
+# SQLite tuning (applied to feeds.db and feed_database.db)
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 16000))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 5))
+# Reader threads (each with its own connection) used by request handlers
+SQLITE_READ_THREADS = int(os.environ.get("SQLITE_READ_THREADS", 4))
+
+# Posts indexed from the firehose are deleted after this many hours
+POST_RETENTION_HOURS = float(os.environ.get("POST_RETENTION_HOURS", 48))
+# Seconds between retention passes
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", 600))
+
+# Seconds before an in-flight feed build is cancelled
+FEED_BUILD_TIMEOUT = float(os.environ.get("FEED_BUILD_TIMEOUT", 30))
+
+# Ranked candidate URIs kept per feed build; clients page through this list
+FEED_CANDIDATE_DEPTH = int(os.environ.get("FEED_CANDIDATE_DEPTH", 300))
+
+# Memory budget for serialized feed responses cached in each process
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Proactive feed refresh scheduler
+FEED_SCHEDULER_ENABLED = _get_bool_env_var(os.environ.get("FEED_SCHEDULER_ENABLED", "true"))
+# Feed builds allowed in flight at once (scheduled and request-driven together)
+FEED_SCHEDULER_CONCURRENCY = int(os.environ.get("FEED_SCHEDULER_CONCURRENCY", 4))
+# Refresh interval for feeds with little traffic (seconds)
+FEED_IDLE_REFRESH_INTERVAL = float(os.environ.get("FEED_IDLE_REFRESH_INTERVAL", 1800))
+# Longest backoff for feeds whose builds keep failing (seconds)
+FEED_REFRESH_MAX_BACKOFF = float(os.environ.get("FEED_REFRESH_MAX_BACKOFF", 3600))
+
+# Blocked keywords only match whole words ("ai" doesn't block "said")
+FILTER_WORD_BOUNDARY = _get_bool_env_var(os.environ.get("FILTER_WORD_BOUNDARY", "true"))
+
+# Keep recent firehose posts in memory so feed builds can skip network
+# hydration for them. Bounded by count and age.
+LOCAL_POST_STORE = _get_bool_env_var(os.environ.get("LOCAL_POST_STORE"))
+LOCAL_POST_STORE_MAX_POSTS = int(os.environ.get("LOCAL_POST_STORE_MAX_POSTS", 200_000))
+LOCAL_POST_STORE_MAX_AGE_HOURS = float(os.environ.get("LOCAL_POST_STORE_MAX_AGE_HOURS", 24))
+
+# Answer topic_preference searches from an in-process index of recent
+# firehose posts instead of CUSTOM_API_URL. Vectors are kept in a
+# memory-mapped file (CAPACITY x 384 float32, ~1.5 KB per post).
+LOCAL_VECTOR_INDEX = _get_bool_env_var(os.environ.get("LOCAL_VECTOR_INDEX"))
+LOCAL_VECTOR_INDEX_PATH = os.environ.get("LOCAL_VECTOR_INDEX_PATH", "vector_index.f32")
+LOCAL_VECTOR_INDEX_CAPACITY = int(os.environ.get("LOCAL_VECTOR_INDEX_CAPACITY", 500_000))
+LOCAL_VECTOR_INDEX_MAX_AGE_HOURS = float(os.environ.get("LOCAL_VECTOR_INDEX_MAX_AGE_HOURS", 24))
+
+# Keep the most recent posts of every account_preference DID in memory,
+# maintained from the firehose, so author sources don't call getAuthorFeed
+# on each refresh. Each buffer is seeded from the network once.
+AUTHOR_INDEX = _get_bool_env_var(os.environ.get("AUTHOR_INDEX", "true"))
+AUTHOR_INDEX_SIZE = int(os.environ.get("AUTHOR_INDEX_SIZE", 100))
+
+# Route firehose posts to every feed's candidate table by its sources
+# (followed accounts, topic words, blocked accounts and words)
+FEED_ROUTING = _get_bool_env_var(os.environ.get("FEED_ROUTING", "true"))
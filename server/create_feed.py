@@ -1,7 +1,11 @@
 from atproto import Client, models
 from server.models import Feed, FeedSource
 from server.algos import algos
-from server.algos.feed import make_handler
+from server.algos.feed import make_handler, embed_topic, EMBEDDING_MODEL_ID
+from server.algos.embedding_cache import to_blob, topic_embeddings
+from server.algos.filters import invalidate_filter
+from server import router
+from server.author_index import track_account_sources
 import os
 
 def create_feed(handle, password, hostname, record_name, display_name="", description="",
@@ -68,10 +72,15 @@ def create_feed(handle, password, hostname, record_name, display_name="", descri
 
         # Preferences (positive)
         for topic in blueprint.get('topics', []):
+            # Encode once here so feed refreshes never run the model
+            vector = embed_topic(topic['name'])
+            topic_embeddings.put((EMBEDDING_MODEL_ID, topic['name']), vector)
             FeedSource.create(
                 feed=feed,
                 source_type='topic_preference',
-                identifier=topic['name']
+                identifier=topic['name'],
+                embedding=to_blob(vector),
+                embedding_model=EMBEDDING_MODEL_ID,
             )
         for account_did in blueprint.get('suggested_accounts', []):
             FeedSource.create(
@@ -96,6 +105,11 @@ def create_feed(handle, password, hostname, record_name, display_name="", descri
                 identifier=blocked_did
             )
 
+        # Recompile filters from the new sources on the next build
+        invalidate_filter(feed_uri)
+        track_account_sources()
+        router.reload()
+
     # Dynamically add handler to algos
     algos[feed_uri] = make_handler(feed_uri)
 
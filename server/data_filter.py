@@ -5,8 +5,16 @@ from collections import defaultdict
 from atproto import models
 
 from server import config
+from server.author_index import author_index
 from server.logger import logger
-from server.database import db, Post
+from server.post_store import post_store
+from server.router import routing_table
+from server.vector_index import vector_index
+from server.write_buffer import post_buffer
+
+
+# Collections operations_callback reads; the firehose skips decoding everything else
+INTERESTED_COLLECTIONS = {models.ids.AppBskyFeedPost}
 
 
 def is_archive_post(record: 'models.AppBskyFeedPost.Record') -> bool:
@@ -49,6 +57,8 @@ def operations_callback(ops: defaultdict) -> None:
     # for example, let's create our custom feed that will contain all posts that contains 'python' related text
 
     posts_to_create = []
+    candidates = []
+    table = routing_table()
     for created_post in ops[models.ids.AppBskyFeedPost]['created']:
         author = created_post['author']
         record = created_post['record']
@@ -67,9 +77,31 @@ def operations_callback(ops: defaultdict) -> None:
             f': {inlined_text}'
         )
 
+        # Every post goes to the local store so feed builds can skip hydrating it
+        if post_store is not None:
+            post_store.add(
+                created_post['uri'],
+                author,
+                record.text,
+                record.created_at,
+                reply_root=record.reply.root.uri if record.reply else None,
+                reply_parent=record.reply.parent.uri if record.reply else None,
+                embed_type=getattr(record.embed, 'py_type', None),
+            )
+
+        if author_index is not None:
+            author_index.add(author, created_post['uri'])
+
+        if vector_index is not None:
+            vector_index.enqueue(created_post['uri'], record.text)
+
         if should_ignore_post(created_post):
             continue
 
+        # Route to every /manage-feed feed whose rules match, in one pass
+        for feed_uri in table.route(author, record.text):
+            candidates.append({'feed_uri': feed_uri, 'uri': created_post['uri'], 'cid': created_post['cid']})
+
         # only python-related posts
         if 'python' in record.text.lower():
             reply_root = reply_parent = None
@@ -86,13 +118,19 @@ def operations_callback(ops: defaultdict) -> None:
             posts_to_create.append(post_dict)
 
     posts_to_delete = ops[models.ids.AppBskyFeedPost]['deleted']
-    if posts_to_delete:
-        post_uris_to_delete = [post['uri'] for post in posts_to_delete]
-        Post.delete().where(Post.uri.in_(post_uris_to_delete))
-        logger.debug(f'Deleted from feed: {len(post_uris_to_delete)}')
-
-    if posts_to_create:
-        with db.atomic():
-            for post_dict in posts_to_create:
-                Post.create(**post_dict)
-        logger.debug(f'Added to feed: {len(posts_to_create)}')
+    post_uris_to_delete = [post['uri'] for post in posts_to_delete]
+    for uri in post_uris_to_delete:
+        if post_store is not None:
+            post_store.delete(uri)
+        if vector_index is not None:
+            vector_index.delete(uri)
+        if author_index is not None:
+            author_index.delete(uri)
+
+    # Written in batches across commits; see PostWriteBuffer
+    if posts_to_create or candidates or post_uris_to_delete:
+        post_buffer.add(posts_to_create, post_uris_to_delete, candidates)
+        logger.debug(
+            f'Queued for feed: {len(posts_to_create)} added, {len(candidates)} routed, '
+            f'{len(post_uris_to_delete)} deleted'
+        )
@@ -1,10 +1,16 @@
 import logging
+import time
 from collections import defaultdict
 
-from atproto import AtUri, CAR, firehose_models, FirehoseSubscribeReposClient, models, parse_subscribe_repos_message
+from atproto import CAR, firehose_models, FirehoseSubscribeReposClient, models, parse_subscribe_repos_message
 from atproto.exceptions import FirehoseError
 
+from server import config, metrics
+from server.checkpoint import Checkpointer
 from server.database import SubscriptionState
+from server.firehose_pool import FirehoseWorkerPool
+from server.frame_queue import FrameQueue
+from server.frame_source import RecordingClient
 from server.logger import logger
 
 _INTERESTED_RECORDS = {
@@ -14,22 +20,50 @@ _INTERESTED_RECORDS = {
 }
 
 
-def _get_ops_by_type(commit: models.ComAtprotoSyncSubscribeRepos.Commit) -> defaultdict:
+_RECORD_TYPE_BY_NSID = {nsid: record_type for record_type, nsid in _INTERESTED_RECORDS.items()}
+
+
+def _get_ops_by_type(
+    commit: models.ComAtprotoSyncSubscribeRepos.Commit, collections: frozenset = None
+) -> defaultdict:
+    """Group a commit's creates and deletes by collection.
+
+    Only ops whose collection is in `collections` (default: every collection in
+    _INTERESTED_RECORDS) are kept. They are picked out by their path before the
+    CAR is parsed, and the CAR is parsed only when a kept create needs a record.
+    """
+    if collections is None:
+        collections = _RECORD_TYPE_BY_NSID.keys()
+
     operation_by_type = defaultdict(lambda: {'created': [], 'deleted': []})
 
-    car = CAR.from_bytes(commit.blocks)
+    wanted_ops = []
     for op in commit.ops:
         if op.action == 'update':
             # we are not interested in updates
             continue
+        # op.path is '<collection>/<rkey>'
+        collection = op.path.split('/', 1)[0]
+        if collection not in collections:
+            continue
+        if op.action == 'create' and not op.cid:
+            continue
+        wanted_ops.append((op, collection))
+
+    if not wanted_ops:
+        return operation_by_type
 
-        uri = AtUri.from_str(f'at://{commit.repo}/{op.path}')
+    car = None
+    for op, collection in wanted_ops:
+        uri = f'at://{commit.repo}/{op.path}'
 
         if op.action == 'create':
-            if not op.cid:
+            record_type = _RECORD_TYPE_BY_NSID.get(collection)
+            if record_type is None:
                 continue
 
-            create_info = {'uri': str(uri), 'cid': str(op.cid), 'author': commit.repo}
+            if car is None:
+                car = CAR.from_bytes(commit.blocks)
 
             record_raw_data = car.blocks.get(op.cid)
             if not record_raw_data:
@@ -39,58 +73,130 @@ def _get_ops_by_type(commit: models.ComAtprotoSyncSubscribeRepos.Commit) -> defa
             if record is None:  # unknown record (out of bsky lexicon)
                 continue
 
-            for record_type, record_nsid in _INTERESTED_RECORDS.items():
-                if uri.collection == record_nsid and models.is_record_type(record, record_type):
-                    operation_by_type[record_nsid]['created'].append({'record': record, **create_info})
-                    break
+            if models.is_record_type(record, record_type):
+                create_info = {'uri': uri, 'cid': str(op.cid), 'author': commit.repo}
+                operation_by_type[collection]['created'].append({'record': record, **create_info})
 
         if op.action == 'delete':
-            operation_by_type[uri.collection]['deleted'].append({'uri': str(uri)})
+            operation_by_type[collection]['deleted'].append({'uri': uri})
 
     return operation_by_type
 
 
-def run(name, operations_callback, stream_stop_event=None):
-    while stream_stop_event is None or not stream_stop_event.is_set():
-        try:
-            _run(name, operations_callback, stream_stop_event)
-        except FirehoseError as e:
-            if logger.level == logging.DEBUG:
-                raise e
-            logger.error(f'Firehose error: {e}. Reconnecting to the firehose.')
+def run(name, operations_callback, stream_stop_event=None, workers=0, collections=None, source=None,
+        queue_size=0, overflow_policy='block'):
+    """Consume the firehose until stream_stop_event is set.
+
+    With workers > 0, commits are decoded on that many worker processes
+    (see FirehoseWorkerPool) and this thread only receives frames.
+    `collections` limits decoding to the collections operations_callback uses.
+    `source` replaces the relay connection with another frame source (such as
+    frame_source.ReplaySource); it is consumed once, without reconnecting.
+    With queue_size > 0, frames are handed to a consumer thread through a
+    FrameQueue of that size, so the socket is never held up by processing;
+    `overflow_policy` says what happens when it fills up.
+    """
+    if collections is not None:
+        collections = frozenset(collections)
+
+    checkpointer = Checkpointer(name)
+    checkpointer.start()
+    metrics.firehose_lag.set_function(lambda: checkpointer.lag)
+    metrics.firehose_consumer_lag.set_function(
+        lambda: None if checkpointer.live_seq is None or checkpointer.processed_seq is None
+        else checkpointer.live_seq - checkpointer.processed_seq
+    )
+
+    pool = None
+    if workers > 0:
+        pool = FirehoseWorkerPool(workers, operations_callback, collections, on_progress=checkpointer.advance)
+        pool.start()
+
+    process = _make_processor(operations_callback, pool, collections, checkpointer)
+    frame_queue = None
+    if queue_size > 0:
+        essential = collections if collections is not None else _RECORD_TYPE_BY_NSID.keys()
+        frame_queue = FrameQueue(process, queue_size, overflow_policy, essential, config.FIREHOSE_SPILL_PATH)
+        frame_queue.start()
+        process = frame_queue.put
+
+    try:
+        if source is not None:
+            _run(name, process, stream_stop_event, checkpointer, source)
+            return
 
+        while stream_stop_event is None or not stream_stop_event.is_set():
+            try:
+                _run(name, process, stream_stop_event, checkpointer)
+            except FirehoseError as e:
+                if logger.level == logging.DEBUG:
+                    raise e
+                logger.error(f'Firehose error: {e}. Reconnecting to the firehose.')
+    finally:
+        # drain what was already received before the final checkpoint
+        if frame_queue:
+            frame_queue.stop()
+        if pool:
+            pool.stop()
+        checkpointer.stop()
+
+
+def _make_processor(operations_callback, pool, collections, checkpointer):
+    """Return the function that handles one received frame."""
+    callback_seconds = metrics.callback_seconds
+
+    def process(message: firehose_models.MessageFrame) -> None:
+        if pool:
+            # the pool reports progress to the checkpointer as workers finish
+            pool.submit(message)
+            return
 
-def _run(name, operations_callback, stream_stop_event=None):
+        commit = parse_subscribe_repos_message(message)
+        if isinstance(commit, models.ComAtprotoSyncSubscribeRepos.Commit) and commit.blocks:
+            ops = _get_ops_by_type(commit, collections)
+            if ops:
+                start = time.perf_counter()
+                operations_callback(ops)
+                callback_seconds.observe(time.perf_counter() - start)
+
+        # every frame counts as processed, including ones we skip
+        checkpointer.advance(message.body['seq'])
+
+    return process
+
+
+def _run(name, process, stream_stop_event=None, checkpointer=None, source=None):
     state = SubscriptionState.get_or_none(SubscriptionState.service == name)
 
     params = None
     if state:
         params = models.ComAtprotoSyncSubscribeRepos.Params(cursor=state.cursor)
 
-    client = FirehoseSubscribeReposClient(params)
+    if source is not None:
+        client = source
+    elif config.FIREHOSE_RECORD_PATH:
+        client = RecordingClient(params, path=config.FIREHOSE_RECORD_PATH)
+    else:
+        client = FirehoseSubscribeReposClient(params)
+    checkpointer.client = client
 
     if not state:
         SubscriptionState.create(service=name, cursor=0)
 
+    events = metrics.firehose_events
+
     def on_message_handler(message: firehose_models.MessageFrame) -> None:
         # stop on next message if requested
         if stream_stop_event and stream_stop_event.is_set():
             client.stop()
             return
 
-        commit = parse_subscribe_repos_message(message)
-        if not isinstance(commit, models.ComAtprotoSyncSubscribeRepos.Commit):
-            return
-
-        # update stored state every ~1k events
-        if commit.seq % 1000 == 0:  # lower value could lead to performance issues
-            logger.debug(f'Updated cursor for {name} to {commit.seq}')
-            client.update_params(models.ComAtprotoSyncSubscribeRepos.Params(cursor=commit.seq))
-            SubscriptionState.update(cursor=commit.seq).where(SubscriptionState.service == name).execute()
-
-        if not commit.blocks:
+        seq = message.body.get('seq')
+        if seq is None:
             return
+        checkpointer.observe(seq)
+        events.inc()
 
-        operations_callback(_get_ops_by_type(commit))
+        process(message)
 
     client.start(on_message_handler)
@@ -2,7 +2,9 @@ from datetime import datetime
 
 import peewee
 
-db = peewee.SqliteDatabase('feed_database.db')
+from server.storage import sqlite_database
+
+db = sqlite_database('feed_database.db')
 
 
 class BaseModel(peewee.Model):
@@ -15,7 +17,21 @@ class Post(BaseModel):
     cid = peewee.CharField()
     reply_parent = peewee.CharField(null=True, default=None)
     reply_root = peewee.CharField(null=True, default=None)
-    indexed_at = peewee.DateTimeField(default=datetime.utcnow)
+    indexed_at = peewee.DateTimeField(default=datetime.utcnow, index=True)
+
+
+class FeedCandidate(BaseModel):
+    """A firehose post routed to a feed by server.router."""
+    feed_uri = peewee.CharField()
+    uri = peewee.CharField(index=True)
+    cid = peewee.CharField()
+    indexed_at = peewee.DateTimeField(default=datetime.utcnow, index=True)
+
+    class Meta:
+        indexes = (
+            (('feed_uri', 'uri'), True),
+            (('feed_uri', 'indexed_at'), False),
+        )
 
 
 class SubscriptionState(BaseModel):
@@ -25,4 +41,4 @@ class SubscriptionState(BaseModel):
 
 if db.is_closed():
     db.connect()
-    db.create_tables([Post, SubscriptionState])
+    db.create_tables([Post, FeedCandidate, SubscriptionState])
@@ -0,0 +1,217 @@
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+from atproto import firehose_models, parse_subscribe_repos_message
+
+from server import metrics
+from server.logger import logger
+
+# Frames buffered per worker before the receive thread blocks
+WORKER_QUEUE_SIZE = 1000
+# How often the writer checks that every worker is still alive (seconds)
+LIVENESS_INTERVAL = 1.0
+
+_COMMIT_TYPE = '#commit'
+
+
+def _worker_main(in_queue, out_queue, collections) -> None:
+    """Decode commits in a worker process and hand ops back to the writer."""
+    # imported here so the spawned process pays for it, not the parent
+    from server.data_stream import _get_ops_by_type
+
+    while True:
+        item = in_queue.get()
+        if item is None:
+            out_queue.put(None)
+            return
+
+        seq, body = item
+        ops = None
+        try:
+            message = firehose_models.MessageFrame(firehose_models.MessageFrameHeader(t=_COMMIT_TYPE), body)
+            commit = parse_subscribe_repos_message(message)
+            if commit.blocks:
+                # defaultdict with a lambda factory can't be pickled
+                ops = dict(_get_ops_by_type(commit, collections))
+        except Exception as e:
+            logger.error(f'Failed to decode commit {seq}: {e}')
+
+        out_queue.put((seq, ops))
+
+
+class SeqTracker:
+    """Track dispatched seqs and the highest seq with everything before it done."""
+
+    def __init__(self, on_progress=None):
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self.watermark = None
+        self.on_progress = on_progress
+
+    def dispatched(self, seq: int) -> None:
+        with self._lock:
+            self._pending[seq] = False
+
+    def completed(self, seq: int) -> None:
+        with self._lock:
+            if seq in self._pending:
+                self._pending[seq] = True
+            previous = self.watermark
+            while self._pending:
+                first_seq, done = next(iter(self._pending.items()))
+                if not done:
+                    break
+                self._pending.popitem(last=False)
+                self.watermark = first_seq
+            if self.on_progress and self.watermark != previous:
+                self.on_progress(self.watermark)
+
+
+class FirehoseWorkerPool:
+    """Decode firehose commits on worker processes, sharded by repo DID.
+
+    The receive thread only calls submit(). Commits from one repo always go
+    to the same worker, so per-repo order is kept. A single writer thread in
+    this process runs operations_callback on the decoded ops, and
+    `watermark` is the highest seq whose frame, and every frame before it,
+    has been fully processed; it is reported to `on_progress` as it moves.
+    """
+
+    def __init__(self, num_workers: int, operations_callback, collections: frozenset = None, on_progress=None):
+        self.num_workers = num_workers
+        self.operations_callback = operations_callback
+        self.collections = collections
+        self.tracker = SeqTracker(on_progress)
+
+        self._context = multiprocessing.get_context('spawn')
+        self._out_queue = self._context.Queue()
+        self._in_queues = [self._context.Queue(maxsize=WORKER_QUEUE_SIZE) for _ in range(num_workers)]
+        self._workers = [self._make_worker(i) for i in range(num_workers)]
+        # commits handed to a worker and not back yet: seq -> (shard, body),
+        # so a dead worker's frames can be sent again
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._writer = threading.Thread(target=self._write_loop, name='firehose-writer', daemon=True)
+
+    def _make_worker(self, shard: int):
+        return self._context.Process(
+            target=_worker_main,
+            args=(self._in_queues[shard], self._out_queue, self.collections),
+            name=f'firehose-worker-{shard}',
+            daemon=True,
+        )
+
+    @property
+    def watermark(self):
+        return self.tracker.watermark
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._writer.start()
+        logger.info(f'Started {self.num_workers} firehose worker processes')
+
+    def submit(self, message: firehose_models.MessageFrame) -> None:
+        """Queue a raw frame; blocks if the target worker is too far behind."""
+        body = message.body
+        seq = body.get('seq')
+        if seq is None:
+            return
+
+        self.tracker.dispatched(seq)
+        if message.type != _COMMIT_TYPE:
+            # nothing to decode, but it still counts towards the watermark
+            self.tracker.completed(seq)
+            return
+
+        shard = zlib.crc32(body['repo'].encode()) % self.num_workers
+        with self._lock:
+            self._inflight[seq] = (shard, body)
+            in_queue = self._in_queues[shard]
+        self._put(shard, in_queue, (seq, body))
+
+    def _put(self, shard: int, in_queue, item) -> None:
+        while True:
+            try:
+                in_queue.put(item, timeout=LIVENESS_INTERVAL)
+                return
+            except queue.Full:
+                if self._in_queues[shard] is not in_queue:
+                    # the worker was restarted and its frames resent, this one included
+                    return
+                if self._stopping and not self._workers[shard].is_alive():
+                    return
+
+    def _check_workers(self) -> None:
+        for shard, worker in enumerate(self._workers):
+            if not worker.is_alive() and not self._stopping:
+                self._restart_worker(shard)
+
+    def _restart_worker(self, shard: int) -> None:
+        """Replace a dead worker and resend the commits it had not finished.
+
+        The dead worker's queue is abandoned (it may have died holding its
+        lock) and a fresh one is filled in seq order before submit() can add
+        newer frames, so per-repo order is kept. Results that already made it
+        back are ignored when they arrive a second time.
+        """
+        dead = self._workers[shard]
+        with self._lock:
+            resend = [(seq, body) for seq, (s, body) in self._inflight.items() if s == shard]
+            logger.error(
+                f'{dead.name} died (exit code {dead.exitcode}); restarting it '
+                f'and resending {len(resend)} commits'
+            )
+            self._in_queues[shard] = self._context.Queue(maxsize=WORKER_QUEUE_SIZE)
+            self._workers[shard] = self._make_worker(shard)
+            self._workers[shard].start()
+            for item in resend:
+                self._in_queues[shard].put(item)
+        metrics.firehose_worker_restarts.inc()
+
+    def _write_loop(self) -> None:
+        callback_seconds = metrics.callback_seconds
+        finished = 0
+        checked = time.monotonic()
+        while finished < self.num_workers:
+            if time.monotonic() - checked >= LIVENESS_INTERVAL:
+                self._check_workers()
+                checked = time.monotonic()
+            try:
+                item = self._out_queue.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                if self._stopping and not any(worker.is_alive() for worker in self._workers):
+                    # a worker died while stopping and will never send its sentinel
+                    break
+                continue
+            if item is None:
+                finished += 1
+                continue
+
+            seq, ops = item
+            with self._lock:
+                if self._inflight.pop(seq, None) is None:
+                    continue  # already handled before its worker was restarted
+            if ops:
+                start = time.perf_counter()
+                try:
+                    self.operations_callback(defaultdict(lambda: {'created': [], 'deleted': []}, ops))
+                except Exception as e:
+                    logger.error(f'operations_callback failed for seq {seq}: {e}')
+                callback_seconds.observe(time.perf_counter() - start)
+            self.tracker.completed(seq)
+
+    def stop(self) -> None:
+        """Let workers finish queued frames, then stop them and the writer."""
+        self._stopping = True
+        for shard, in_queue in enumerate(self._in_queues):
+            self._put(shard, in_queue, None)
+        for worker in self._workers:
+            worker.join()
+        self._writer.join()
+        logger.info('Firehose worker processes stopped')
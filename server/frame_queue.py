@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+
+from atproto import firehose_models
+
+from server import metrics
+from server.frame_source import encode_frame, read_frame, write_frame
+from server.logger import logger
+
+POLICIES = ('block', 'drop', 'spill')
+
+_COMMIT_TYPE = '#commit'
+_STOP = object()
+
+
+class SpillLog:
+    """FIFO of frames on disk, used once the in-memory queue is full."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending = 0
+        self._file = open(path, 'w+b')
+        self._read_at = 0
+
+    def append(self, message: firehose_models.MessageFrame) -> None:
+        self._file.seek(0, os.SEEK_END)
+        write_frame(self._file, encode_frame(message))
+        self.pending += 1
+
+    def pop(self):
+        """Oldest spilled raw frame, or None if the log is empty."""
+        if not self.pending:
+            return None
+        self._file.seek(self._read_at)
+        data = read_frame(self._file)
+        self._read_at = self._file.tell()
+        self.pending -= 1
+        if not self.pending:
+            # drained: reclaim the space
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_at = 0
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+        os.remove(self.path)
+
+
+class FrameQueue:
+    """Bounded hand-off between the firehose socket and frame processing.
+
+    put() is called on the websocket thread and only enqueues; a consumer
+    thread runs `process(message)` in arrival order. When the queue is full,
+    `policy` decides what the receive side does:
+
+    block  wait for room (the socket stalls only while the queue is full)
+    drop   discard frames with no op in `essential` collections, block on the rest
+    spill  append frames to a log at `spill_path` and replay it once the
+           consumer catches up; order is kept by spilling everything that
+           arrives while the log is non-empty
+    """
+
+    def __init__(self, process, size: int, policy: str = 'block', essential=None,
+                 spill_path: str = 'firehose_spill.frames'):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown firehose overflow policy {policy!r}; expected one of {POLICIES}')
+        self.process = process
+        self.policy = policy
+        self.essential = frozenset(essential) if essential is not None else None
+        self._queue = queue.Queue(maxsize=size)
+        self._spill = SpillLog(spill_path) if policy == 'spill' else None
+        self._spill_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._consume, name='firehose-consumer', daemon=True)
+
+        self._dropped = metrics.firehose_frames_dropped
+        self._spilled = metrics.firehose_frames_spilled
+        metrics.firehose_queue_depth.set_function(self.depth)
+
+    def depth(self) -> int:
+        """Frames waiting, in memory and spilled."""
+        return self._queue.qsize() + (self._spill.pending if self._spill else 0)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _is_essential(self, message: firehose_models.MessageFrame) -> bool:
+        if self.essential is None:
+            return True
+        if message.type != _COMMIT_TYPE:
+            return False
+        return any(op['path'].split('/', 1)[0] in self.essential for op in message.body.get('ops') or ())
+
+    def put(self, message: firehose_models.MessageFrame) -> None:
+        if self._spill is not None:
+            with self._spill_lock:
+                if self._spill.pending:
+                    self._spill.append(message)
+                    self._spilled.inc()
+                    return
+                try:
+                    self._queue.put_nowait(message)
+                except queue.Full:
+                    self._spill.append(message)
+                    self._spilled.inc()
+            return
+
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            if self.policy == 'drop' and not self._is_essential(message):
+                self._dropped.inc()
+                return
+            self._queue.put(message)
+
+    def _next(self):
+        """Next frame in arrival order: the memory queue first, then the spill log."""
+        if self._spill is not None and self._spill.pending:
+            with self._spill_lock:
+                data = self._spill.pop() if self._queue.empty() else None
+            if data is not None:
+                return firehose_models.Frame.from_bytes(data)
+        try:
+            return self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return None
+
+    def _consume(self) -> None:
+        while True:
+            message = self._next()
+            if message is None:
+                continue
+            if message is _STOP:
+                # everything queued in memory before stop() is done; frames
+                # spilled after the queue filled up are newer, so go last
+                while self._spill is not None and (data := self._spill.pop()) is not None:
+                    self._process(firehose_models.Frame.from_bytes(data))
+                return
+            self._process(message)
+
+    def _process(self, message) -> None:
+        try:
+            self.process(message)
+        except Exception as e:
+            logger.error(f'Failed to process firehose frame: {e}')
+
+    def stop(self) -> None:
+        """Process everything already received, then stop the consumer."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._spill is not None:
+            self._spill.close()
@@ -0,0 +1,229 @@
+import datetime
+import gzip
+import hashlib
+import random
+import struct
+
+import libipld
+from atproto import FirehoseSubscribeReposClient, firehose_models
+
+from server.logger import logger
+
+# Each recorded frame is a 4-byte big-endian length followed by the raw
+# websocket frame (DAG-CBOR header + body), exactly as the relay sent it.
+_LENGTH = struct.Struct('>I')
+
+
+def _open(path: str, mode: str):
+    """Open a frame file; '.gz' paths are gzip-compressed."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def write_frame(f, data: bytes) -> None:
+    f.write(_LENGTH.pack(len(data)))
+    f.write(data)
+
+
+def read_frame(f):
+    """Read the next frame from `f`; None at the end (or a truncated tail)."""
+    prefix = f.read(_LENGTH.size)
+    if len(prefix) < _LENGTH.size:
+        return None
+    (length,) = _LENGTH.unpack(prefix)
+    data = f.read(length)
+    if len(data) < length:
+        logger.warning(f'Truncated frame at the end of {getattr(f, "name", "frame file")}')
+        return None
+    return data
+
+
+def encode_frame(message: firehose_models.MessageFrame) -> bytes:
+    """Re-encode a decoded message frame into its wire form."""
+    return libipld.encode_dag_cbor({'op': 1, 't': message.type}) + libipld.encode_dag_cbor(message.body)
+
+
+def read_frames(path: str):
+    """Yield raw frames from a file written by FrameRecorder."""
+    with _open(path, 'rb') as f:
+        while (data := read_frame(f)) is not None:
+            yield data
+
+
+class FrameRecorder:
+    """Append raw firehose frames to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self._file = _open(path, 'ab')
+
+    def write(self, data: bytes) -> None:
+        write_frame(self._file, data)
+        self.frames += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RecordingClient(FirehoseSubscribeReposClient):
+    """The live firehose client, also dumping every raw frame to `path`."""
+
+    def __init__(self, params=None, path: str = 'firehose.frames', **kwargs):
+        super().__init__(params, **kwargs)
+        self.recorder = FrameRecorder(path)
+
+    def _decode_frame(self, raw_frame):
+        if isinstance(raw_frame, bytes):
+            self.recorder.write(raw_frame)
+        return super()._decode_frame(raw_frame)
+
+    def stop(self) -> None:
+        super().stop()
+        self.recorder.close()
+
+
+class ReplaySource:
+    """Frame source that plays back raw frames as fast as they are consumed.
+
+    Stands in for FirehoseSubscribeReposClient in data_stream.run: start()
+    decodes each frame and calls the handler, then returns once the frames
+    run out (or stop() is called).
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.delivered = 0
+        self._stopped = False
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ReplaySource':
+        return cls(read_frames(path))
+
+    def start(self, on_message_callback, on_callback_error_callback=None) -> None:
+        for raw in self.frames:
+            if self._stopped:
+                break
+            try:
+                frame = firehose_models.Frame.from_bytes(raw)
+            except Exception as e:
+                logger.warning(f'Skipping undecodable frame: {e}')
+                continue
+            if not isinstance(frame, firehose_models.MessageFrame):
+                continue
+            on_message_callback(frame)
+            self.delivered += 1
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def update_params(self, params) -> None:
+        """Cursors are meaningless for a replay; accepted so Checkpointer can call it."""
+
+
+def _cid(data: bytes) -> bytes:
+    """CIDv1 (dag-cbor, sha2-256) of a block, in binary form."""
+    return bytes((0x01, 0x71, 0x12, 0x20)) + hashlib.sha256(data).digest()
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _car(root: bytes, blocks: list[tuple[bytes, bytes]]) -> bytes:
+    header = libipld.encode_dag_cbor({'version': 1, 'roots': [root]})
+    parts = [_varint(len(header)), header]
+    for cid, data in blocks:
+        parts.append(_varint(len(cid) + len(data)))
+        parts.append(cid)
+        parts.append(data)
+    return b''.join(parts)
+
+
+# Any valid CID; like/repost subjects aren't resolved during ingestion
+_SUBJECT_CID = 'bafyreihltcnuuyqp2jm24aqydpnlj7b6w3ogwrplomrjtg5rifv44mmjey'
+
+# Share of synthetic ops by kind; the rest are app.bsky.feed.post creates
+SYNTHETIC_MIX = {
+    'like': 0.35,
+    'follow': 0.10,
+    'delete': 0.05,
+    'repost': 0.10,  # a collection no callback consumes
+}
+
+
+def synthetic_frames(count: int, texts: list[str], seed: int = 0, authors: int = 10_000, start_seq: int = 1):
+    """Yield `count` commit frames shaped like the live firehose.
+
+    Every commit carries one op drawn from SYNTHETIC_MIX, with a real CAR of
+    its record block, so frames exercise the full decode path.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.UTC).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    header = libipld.encode_dag_cbor({'op': 1, 't': '#commit'})
+    recent = []
+
+    for i in range(count):
+        repo = f'did:plc:synthetic{rng.randrange(authors):06d}'
+        rkey = f'3k{start_seq + i:011d}'
+        roll = rng.random()
+
+        if roll < SYNTHETIC_MIX['delete'] and recent:
+            action, path, record = 'delete', recent[rng.randrange(len(recent))], None
+        else:
+            roll -= SYNTHETIC_MIX['delete']
+            action = 'create'
+            if roll < SYNTHETIC_MIX['like'] and recent:
+                subject = {'uri': f'at://{repo}/{recent[-1]}', 'cid': _SUBJECT_CID}
+                path = f'app.bsky.feed.like/{rkey}'
+                record = {'$type': 'app.bsky.feed.like', 'subject': subject, 'createdAt': now}
+            elif roll < SYNTHETIC_MIX['like'] + SYNTHETIC_MIX['follow']:
+                path = f'app.bsky.graph.follow/{rkey}'
+                subject = f'did:plc:synthetic{rng.randrange(authors):06d}'
+                record = {'$type': 'app.bsky.graph.follow', 'subject': subject, 'createdAt': now}
+            elif roll < SYNTHETIC_MIX['like'] + SYNTHETIC_MIX['follow'] + SYNTHETIC_MIX['repost']:
+                path = f'app.bsky.feed.repost/{rkey}'
+                subject = {'uri': f'at://{repo}/{path}', 'cid': _SUBJECT_CID}
+                record = {'$type': 'app.bsky.feed.repost', 'subject': subject, 'createdAt': now}
+            else:
+                path = f'app.bsky.feed.post/{rkey}'
+                text = texts[rng.randrange(len(texts))]
+                record = {'$type': 'app.bsky.feed.post', 'text': text, 'langs': ['en'], 'createdAt': now}
+                recent.append(path)
+                if len(recent) > 1000:
+                    recent.pop(0)
+
+        blocks = []
+        op = {'action': action, 'path': path, 'cid': None}
+        if record is not None:
+            data = libipld.encode_dag_cbor(record)
+            op['cid'] = _cid(data)
+            blocks.append((op['cid'], data))
+
+        commit = libipld.encode_dag_cbor({'did': repo, 'version': 3, 'rev': rkey, 'data': op['cid'] or b''})
+        commit_cid = _cid(commit)
+        blocks.insert(0, (commit_cid, commit))
+
+        body = {
+            'seq': start_seq + i,
+            'rebase': False,
+            'tooBig': False,
+            'repo': repo,
+            'commit': commit_cid,
+            'rev': rkey,
+            'since': None,
+            'blocks': _car(commit_cid, blocks),
+            'ops': [op],
+            'blobs': [],
+            'time': now,
+        }
+        yield header + libipld.encode_dag_cbor(body)
@@ -0,0 +1,83 @@
+import time
+
+import httpx
+
+from server import config, metrics
+from server.logger import logger
+
+_client = None
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Record per-host latency (to response headers) and error counts."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+        self._hosts = {}
+
+    def _series(self, host: str):
+        series = self._hosts.get(host)
+        if series is None:
+            series = self._hosts[host] = (
+                metrics.upstream_seconds.labels(host),
+                metrics.upstream_errors.labels(host, "status"),
+                metrics.upstream_errors.labels(host, "transport"),
+            )
+        return series
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        latency, status_errors, transport_errors = self._series(request.url.host)
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            transport_errors.inc()
+            raise
+        latency.observe(time.perf_counter() - start)
+        if response.status_code >= 400:
+            status_errors.inc()
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the app-lifetime HTTP client, creating it on first use.
+
+    All upstream calls share this client so connections (and TLS sessions)
+    are kept alive and reused across requests and feed builds.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = config.HTTP2_ENABLED
+        if http2 and not _http2_available():
+            logger.warning('HTTP2_ENABLED is set but the "h2" package is not installed; using HTTP/1.1')
+            http2 = False
+
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _client = httpx.AsyncClient(timeout=30.0, transport=InstrumentedTransport(transport))
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared HTTP client. Called on app shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,211 @@
+import bisect
+import math
+import time
+
+# Seconds; covers sub-millisecond callbacks up to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_registry = []
+
+
+# Minimal Prometheus-style metrics for the /metrics endpoint. Metrics are
+# created once at the bottom of this module and series are bound to their
+# labels up front where possible, so hot paths only do an attribute
+# increment. Updates take no locks: each series is written from one thread
+# in practice, and a rare lost increment is acceptable for monitoring.
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1) -> None:
+        self.value += amount
+
+    def samples(self, name):
+        yield name, '', self.value
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def set_function(self, function) -> None:
+        """Compute the value at scrape time instead (None renders as NaN)."""
+        self.function = function
+
+    def samples(self, name):
+        value = self.function() if self.function is not None else self.value
+        yield name, '', math.nan if value is None else value
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            yield f'{name}_bucket', ('le', '+Inf' if bound == math.inf else repr(bound)), cumulative
+        yield f'{name}_sum', '', self.sum
+        yield f'{name}_count', '', self.count
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+        _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the series for these label values; keep it to skip the lookup."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} takes labels {self.labelnames}, got {values}')
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for key, child in list(self._children.items()):
+            pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+            for name, extra, value in child.samples(self.name):
+                labels = pairs + [f'{extra[0]}="{extra[1]}"'] if extra else pairs
+                label_str = '{' + ','.join(labels) + '}' if labels else ''
+                lines.append(f'{name}{label_str} {value}')
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1) -> None:
+        self._default.value += amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value) -> None:
+        self._default.value = value
+
+    def set_function(self, function) -> None:
+        self._default.function = function
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value) -> None:
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+def render() -> bytes:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.append('')
+    return '\n'.join(lines).encode()
+
+
+# Firehose
+firehose_events = Counter('feedgen_firehose_events_total', 'Firehose frames received.')
+firehose_lag = Gauge('feedgen_firehose_lag_events', 'Events between the newest seq received and the saved cursor.')
+firehose_queue_depth = Gauge('feedgen_firehose_queue_depth', 'Frames received but not yet processed (memory + spill).')
+firehose_consumer_lag = Gauge('feedgen_firehose_consumer_lag_events', 'Events between the newest seq received and the last processed.')
+firehose_frames_dropped = Counter('feedgen_firehose_frames_dropped_total', 'Non-essential frames dropped on a full queue.')
+firehose_frames_spilled = Counter('feedgen_firehose_frames_spilled_total', 'Frames spilled to disk on a full queue.')
+firehose_worker_restarts = Counter('feedgen_firehose_worker_restarts_total', 'Firehose worker processes restarted after dying.')
+callback_seconds = Histogram('feedgen_operations_callback_seconds', 'operations_callback duration per commit.')
+
+# Feed serving
+feed_cache_requests = Counter(
+    'feedgen_feed_cache_requests_total', 'getFeedSkeleton requests by cache result (hit, stale, miss).', ['feed', 'result']
+)
+feed_build_seconds = Histogram(
+    'feedgen_feed_build_seconds', 'build_feed time by stage (sources, hydrate, filter, total).', ['stage']
+)
+upstream_seconds = Histogram(
+    'feedgen_upstream_request_seconds', 'Upstream HTTP time to response headers, by host.', ['host']
+)
+upstream_errors = Counter(
+    'feedgen_upstream_errors_total', 'Upstream HTTP errors by host and kind (status, transport).', ['host', 'kind']
+)
+
+# Embeddings
+encode_seconds = Histogram('feedgen_encode_seconds', 'encode_onnx inference time per call.')
+encode_batch_size = Histogram('feedgen_encode_batch_size', 'Texts per encode_onnx call.', buckets=SIZE_BUCKETS)
+
+# SQLite
+sqlite_write_seconds = Histogram(
+    'feedgen_sqlite_write_seconds', 'SQLite write transaction time by database.', ['db']
+)
@@ -1,6 +1,9 @@
-from peewee import Model, SqliteDatabase, TextField, ForeignKeyField, IntegerField
+from peewee import Model, TextField, ForeignKeyField, IntegerField, BlobField
+from playhouse.migrate import SqliteMigrator, migrate
 
-db = SqliteDatabase('feeds.db')
+from server.storage import sqlite_database
+
+db = sqlite_database('feeds.db')
 
 class Feed(Model):
     uri = TextField(unique=True)
@@ -18,6 +21,8 @@ class FeedSource(Model):
     feed = ForeignKeyField(Feed, backref='sources', on_delete='CASCADE')
     source_type = TextField()   # 'account_preference', 'topic_preference', 'account_filter', 'topic_filter'
     identifier = TextField()    # e.g., 'did:plc:example.bsky.social' or 'sports'
+    embedding = BlobField(null=True)        # float32 vector for 'topic_preference' rows
+    embedding_model = TextField(null=True)  # model that produced `embedding`
 
     class Meta:
         database = db
@@ -27,8 +32,20 @@ class FeedSource(Model):
 
 class FeedCache(Model):
     feed_uri = TextField(unique=True)
-    response_json = TextField()  # JSON string of {"cursor":..., "feed":[...]}
+    response_json = TextField()  # JSON string of {"feed":[...]}, the full ranked candidate list
     timestamp = IntegerField()   # UNIX timestamp
 
     class Meta:
-        database = db
\ No newline at end of file
+        database = db
+
+def add_missing_columns():
+    """Add columns introduced after a table was first created."""
+    migrator = SqliteMigrator(db)
+    columns = {c.name for c in db.get_columns(FeedSource._meta.table_name)}
+    operations = [
+        migrator.add_column(FeedSource._meta.table_name, name, getattr(FeedSource, name))
+        for name in ('embedding', 'embedding_model')
+        if name not in columns
+    ]
+    if operations:
+        migrate(*operations)
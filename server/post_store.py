@@ -0,0 +1,80 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from server import config
+
+
+def _now_iso() -> str:
+    return datetime.datetime.now(datetime.UTC).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class LocalPostStore:
+    """Bounded in-memory store of recent posts seen on the firehose.
+
+    Holds just what feed building needs (author, text, timestamps, reply refs,
+    embed type) as plain tuples, oldest first, and evicts by count and age.
+    get_many() returns posts shaped like app.bsky.feed.getPosts results so
+    they can stand in for network hydration.
+    """
+
+    def __init__(self, max_posts: int, max_age: float):
+        self.max_posts = max_posts
+        self.max_age = max_age
+        self._posts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, uri: str, author: str, text: str, created_at: str,
+            reply_root: str = None, reply_parent: str = None, embed_type: str = None) -> None:
+        now = time.monotonic()
+        entry = (now, author, text, created_at, _now_iso(), reply_root, reply_parent, embed_type)
+        with self._lock:
+            self._posts[uri] = entry
+            self._evict(now)
+
+    def delete(self, uri: str) -> None:
+        with self._lock:
+            self._posts.pop(uri, None)
+
+    def _evict(self, now: float) -> None:
+        posts = self._posts
+        while len(posts) > self.max_posts:
+            posts.popitem(last=False)
+        while posts:
+            added_at = next(iter(posts.values()))[0]
+            if now - added_at <= self.max_age:
+                break
+            posts.popitem(last=False)
+
+    def get_many(self, uris) -> dict[str, dict]:
+        """Return the stored posts among `uris`, keyed by URI."""
+        found = {}
+        with self._lock:
+            for uri in uris:
+                entry = self._posts.get(uri)
+                if entry is not None:
+                    found[uri] = entry
+        self.hits += len(found)
+        self.misses += len(uris) - len(found)
+        return {uri: self._as_post_view(uri, entry) for uri, entry in found.items()}
+
+    @staticmethod
+    def _as_post_view(uri: str, entry: tuple) -> dict:
+        _, author, text, created_at, indexed_at, reply_root, reply_parent, embed_type = entry
+        record = {'text': text, 'createdAt': created_at}
+        if reply_root or reply_parent:
+            record['reply'] = {'root': {'uri': reply_root}, 'parent': {'uri': reply_parent}}
+        if embed_type:
+            record['embed'] = {'$type': embed_type}
+        return {'uri': uri, 'author': {'did': author}, 'record': record, 'indexedAt': indexed_at}
+
+    def __len__(self):
+        return len(self._posts)
+
+
+post_store = None
+if config.LOCAL_POST_STORE:
+    post_store = LocalPostStore(config.LOCAL_POST_STORE_MAX_POSTS, config.LOCAL_POST_STORE_MAX_AGE_HOURS * 3600)
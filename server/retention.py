@@ -0,0 +1,98 @@
+import argparse
+import datetime
+import threading
+
+from server.database import db, FeedCandidate, Post
+from server.logger import logger
+
+# Rows deleted per transaction; small enough that the firehose writer
+# never waits long for the write lock
+CHUNK_SIZE = 500
+# Pause between chunks to let queued writes through (seconds)
+CHUNK_PAUSE = 0.05
+# Free pages returned to the OS per pass
+VACUUM_PAGES = 2000
+
+
+def check_incremental_vacuum() -> bool:
+    """Return whether feed_database.db uses incremental auto-vacuum.
+
+    New files get it from storage.sqlite_pragmas(). Converting an existing
+    file needs a full VACUUM, which rewrites the whole database under an
+    exclusive lock, so it is left to `python -m server.retention --vacuum`
+    with the server stopped.
+    """
+    mode = db.execute_sql('PRAGMA auto_vacuum').fetchone()[0]
+    if mode == 2:  # INCREMENTAL
+        return True
+    logger.warning(
+        'feed_database.db does not use incremental auto-vacuum, so purged posts '
+        'will not free disk space; stop the server and run '
+        '`python -m server.retention --vacuum` once to convert it'
+    )
+    return False
+
+
+def vacuum() -> None:
+    """Convert feed_database.db to incremental auto-vacuum. Offline only."""
+    db.execute_sql('PRAGMA auto_vacuum = INCREMENTAL')
+    logger.info('Running VACUUM on feed database...')
+    db.execute_sql('VACUUM')
+    logger.info(f"Done; auto_vacuum = {db.execute_sql('PRAGMA auto_vacuum').fetchone()[0]}")
+
+
+def delete_expired_chunk(cutoff: datetime.datetime, model=Post) -> int:
+    """Delete up to CHUNK_SIZE rows indexed before `cutoff`; return how many."""
+    expired = (
+        model
+        .select(model.id)
+        .where(model.indexed_at < cutoff)
+        .order_by(model.indexed_at)
+        .limit(CHUNK_SIZE)
+    )
+    with db.atomic():
+        return model.delete().where(model.id.in_(expired)).execute()
+
+
+def purge_expired(window: datetime.timedelta, stop_event: threading.Event = None,
+                  incremental: bool = True) -> int:
+    """Delete every post and feed candidate older than `window`, one short chunk at a time."""
+    cutoff = datetime.datetime.utcnow() - window
+    total = 0
+    for model in (Post, FeedCandidate):
+        while stop_event is None or not stop_event.is_set():
+            deleted = delete_expired_chunk(cutoff, model)
+            total += deleted
+            if deleted < CHUNK_SIZE:
+                break
+            if stop_event is not None:
+                stop_event.wait(CHUNK_PAUSE)
+
+    if incremental:
+        db.execute_sql(f'PRAGMA incremental_vacuum({VACUUM_PAGES})')
+    return total
+
+
+def run(window: datetime.timedelta, interval: float, stop_event: threading.Event) -> None:
+    """Purge expired posts every `interval` seconds until `stop_event` is set."""
+    incremental = check_incremental_vacuum()
+    while not stop_event.is_set():
+        try:
+            deleted = purge_expired(window, stop_event, incremental)
+            if deleted:
+                logger.info(f'Retention: deleted {deleted} posts older than {window}')
+        except Exception as e:
+            logger.error(f'Retention pass failed: {e}')
+        stop_event.wait(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Feed database maintenance')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='one-off VACUUM converting the database to incremental auto-vacuum '
+                             '(stop the server first)')
+    args = parser.parse_args()
+    if args.vacuum:
+        vacuum()
+    else:
+        parser.print_help()
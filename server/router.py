@@ -0,0 +1,132 @@
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+
+from server import config
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> set[str]:
+    return set(_TOKEN.findall(text.lower()))
+
+
+class _PhraseIndex:
+    """token -> phrases containing it; a phrase matches when all its tokens occur.
+
+    Each phrase carries the set of feeds that use it, so one lookup per post
+    token finds every matching (phrase, feed) no matter how many feeds exist.
+    """
+
+    def __init__(self, phrases: dict[str, set[str]]):
+        self._feeds = []
+        self._lengths = []
+        self._by_token = defaultdict(list)
+        for phrase, feeds in phrases.items():
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            phrase_id = len(self._feeds)
+            self._feeds.append(frozenset(feeds))
+            self._lengths.append(len(tokens))
+            for token in tokens:
+                self._by_token[token].append(phrase_id)
+        self._by_token = dict(self._by_token)
+
+    def match(self, tokens: set[str]) -> set[str]:
+        """Feeds with at least one phrase fully contained in `tokens`."""
+        hits = {}
+        for token in tokens:
+            for phrase_id in self._by_token.get(token, ()):
+                hits[phrase_id] = hits.get(phrase_id, 0) + 1
+
+        feeds = set()
+        for phrase_id, count in hits.items():
+            if count == self._lengths[phrase_id]:
+                feeds |= self._feeds[phrase_id]
+        return feeds
+
+
+@dataclass(frozen=True)
+class RoutingTable:
+    """Every feed's firehose rules, compiled into shared inverted indexes.
+
+    A post is a candidate for a feed if its author is one of the feed's
+    account_preference DIDs or its text contains one of the feed's
+    topic_preference phrases, unless the feed's account_filter or
+    topic_filter rules block it.
+    """
+
+    authors: dict
+    topics: _PhraseIndex
+    blocked_authors: dict
+    blocked_topics: _PhraseIndex
+
+    @classmethod
+    def from_sources(cls, sources) -> 'RoutingTable':
+        """Build from (feed_uri, source_type, identifier) rows."""
+        authors = defaultdict(set)
+        topics = defaultdict(set)
+        blocked_authors = defaultdict(set)
+        blocked_topics = defaultdict(set)
+        by_type = {
+            'account_preference': authors,
+            'topic_preference': topics,
+            'account_filter': blocked_authors,
+            'topic_filter': blocked_topics,
+        }
+        for feed_uri, source_type, identifier in sources:
+            index = by_type.get(source_type)
+            if index is not None and identifier:
+                index[identifier].add(feed_uri)
+
+        return cls(
+            {did: frozenset(feeds) for did, feeds in authors.items()},
+            _PhraseIndex(topics),
+            {did: frozenset(feeds) for did, feeds in blocked_authors.items()},
+            _PhraseIndex(blocked_topics),
+        )
+
+    def route(self, author: str, text: str) -> set[str]:
+        """Return the URIs of the feeds this post belongs to."""
+        tokens = tokenize(text) if text else set()
+        feeds = set(self.authors.get(author, ())) | self.topics.match(tokens)
+        if not feeds:
+            return feeds
+
+        feeds -= self.blocked_authors.get(author, frozenset())
+        if feeds:
+            feeds -= self.blocked_topics.match(tokens)
+        return feeds
+
+
+EMPTY = RoutingTable.from_sources(())
+
+_table = EMPTY
+_lock = threading.Lock()
+
+
+def routing_table() -> RoutingTable:
+    return _table
+
+
+def reload() -> None:
+    """Recompile the routing table from the feeds database.
+
+    Called at startup and whenever a feed's sources change; the new table is
+    swapped in atomically, so the firehose thread never sees a partial one.
+    """
+    global _table
+    if not config.FEED_ROUTING:
+        return
+    from server.models import Feed, FeedSource
+
+    rows = (
+        FeedSource
+        .select(Feed.uri, FeedSource.source_type, FeedSource.identifier)
+        .join(Feed)
+        .tuples()
+    )
+    with _lock:
+        _table = RoutingTable.from_sources(rows)
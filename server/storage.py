@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import peewee
+
+from server import config, metrics
+
+
+def sqlite_pragmas() -> dict:
+    """Per-connection pragmas for every SQLite database the server opens.
+
+    WAL lets readers proceed while the firehose (or the feed writer) holds
+    the write lock; synchronous=NORMAL is durable across app crashes in WAL
+    mode and only risks the last transactions on power loss. auto_vacuum
+    comes first: it only takes effect if set before the first table is
+    created, which makes it free for new files.
+    """
+    return {
+        'auto_vacuum': 'incremental',
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'cache_size': -config.SQLITE_CACHE_SIZE_KB,  # negative means KiB
+        'mmap_size': config.SQLITE_MMAP_SIZE,
+        'temp_store': 'memory',
+    }
+
+
+def sqlite_database(path: str) -> peewee.SqliteDatabase:
+    """Open a SQLite database with the server's concurrency settings.
+
+    peewee keeps one connection per thread, so the thread pools below double
+    as connection pools.
+    """
+    return peewee.SqliteDatabase(
+        path,
+        pragmas=sqlite_pragmas(),
+        timeout=config.SQLITE_BUSY_TIMEOUT,  # seconds to wait on a locked database
+    )
+
+
+# All feeds.db writes from request handlers go through one thread (and so one
+# connection), which serializes them without contending for the lock.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+# Reads fan out over a small pool of reader connections.
+_readers = ThreadPoolExecutor(max_workers=config.SQLITE_READ_THREADS, thread_name_prefix='sqlite-reader')
+
+
+async def run_read(fn, *args, **kwargs):
+    """Run a blocking read query off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, functools.partial(fn, *args, **kwargs))
+
+
+_write_seconds = metrics.sqlite_write_seconds.labels('feeds')
+
+
+def _timed_write(fn):
+    start = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        _write_seconds.observe(time.perf_counter() - start)
+
+
+async def run_write(fn, *args, **kwargs):
+    """Run a blocking write on the dedicated writer connection."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, _timed_write, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from server import config
+from server.logger import logger
+
+# Texts embedded per encode call, and how long to wait to fill a batch
+EMBED_BATCH_SIZE = 64
+EMBED_BATCH_WAIT = 0.5  # seconds
+# Posts waiting to be embedded; beyond this new posts are dropped
+PENDING_LIMIT = 10_000
+
+
+class VectorIndex:
+    """Rolling in-process semantic index over recent posts.
+
+    Vectors live in a memory-mapped float32 matrix used as a ring buffer:
+    the oldest rows are overwritten once `capacity` is reached, and rows
+    older than `max_age` seconds or deleted on the firehose are masked out
+    of queries. search() is an exact top-k by dot product (the vectors are
+    L2-normalized, so this is cosine similarity).
+    """
+
+    def __init__(self, path: str, capacity: int, dim: int, max_age: float):
+        self.capacity = capacity
+        self.dim = dim
+        self.max_age = max_age
+        self.vectors = np.memmap(path, dtype=np.float32, mode='w+', shape=(capacity, dim))
+        self.added_at = np.zeros(capacity, dtype=np.float64)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.uris = [None] * capacity
+        self._slots = {}
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+        self._pending = queue.Queue(maxsize=PENDING_LIMIT)
+        # URIs queued but not embedded yet, and those deleted meanwhile;
+        # both are bounded by PENDING_LIMIT
+        self._queued = set()
+        self._tombstones = set()
+        self._embedder = None
+        self.dropped = 0
+
+    def __len__(self):
+        return self._count
+
+    def add_vectors(self, uris: list[str], vectors: np.ndarray) -> None:
+        """Append already-embedded posts, overwriting the oldest rows if full."""
+        now = time.monotonic()
+        with self._lock:
+            for uri, vector in zip(uris, vectors):
+                self._queued.discard(uri)
+                if uri in self._tombstones:
+                    # deleted on the firehose while waiting to be embedded
+                    self._tombstones.discard(uri)
+                    continue
+                slot = self._next
+                old_uri = self.uris[slot]
+                if old_uri is not None:
+                    self._slots.pop(old_uri, None)
+                self.vectors[slot] = vector
+                self.uris[slot] = uri
+                self.added_at[slot] = now
+                self.live[slot] = True
+                self._slots[uri] = slot
+                self._next = (slot + 1) % self.capacity
+                self._count = min(self._count + 1, self.capacity)
+
+    def delete(self, uri: str) -> None:
+        with self._lock:
+            slot = self._slots.pop(uri, None)
+            if slot is not None:
+                self.live[slot] = False
+                self.uris[slot] = None
+            elif uri in self._queued:
+                self._tombstones.add(uri)
+
+    def search(self, vector: np.ndarray, k: int = 10) -> list[tuple[str, float]]:
+        """Return up to k (uri, score) pairs, best first."""
+        n = self._count
+        if n == 0 or k <= 0:
+            return []
+
+        scores = self.vectors[:n] @ np.asarray(vector, dtype=np.float32)
+        cutoff = time.monotonic() - self.max_age
+        scores[~self.live[:n] | (self.added_at[:n] < cutoff)] = -np.inf
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        with self._lock:
+            return [
+                (self.uris[i], float(scores[i]))
+                for i in top
+                if np.isfinite(scores[i]) and self.uris[i] is not None
+            ]
+
+    async def search_async(self, vector: np.ndarray, k: int = 10) -> list[tuple[str, float]]:
+        """search() on a worker thread; NumPy releases the GIL for the scan."""
+        return await asyncio.to_thread(self.search, vector, k)
+
+    def enqueue(self, uri: str, text: str) -> None:
+        """Queue a firehose post to be embedded in the background."""
+        if not text:
+            return
+        self._ensure_embedder()
+        with self._lock:
+            self._queued.add(uri)
+        try:
+            self._pending.put_nowait((uri, text))
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(uri)
+            self.dropped += 1
+
+    def _ensure_embedder(self) -> None:
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = threading.Thread(target=self._embed_loop, name='vector-index', daemon=True)
+                    self._embedder.start()
+
+    def _embed_loop(self) -> None:
+        from server.algos.encoder import encode_onnx
+
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + EMBED_BATCH_WAIT
+            while len(batch) < EMBED_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            uris = [uri for uri, _ in batch]
+            try:
+                vectors = encode_onnx([text for _, text in batch])
+            except Exception as e:
+                logger.error(f'Vector index: failed to embed {len(batch)} posts: {e}')
+                with self._lock:
+                    self._queued.difference_update(uris)
+                    self._tombstones.difference_update(uris)
+                continue
+            self.add_vectors(uris, vectors)
+
+
+vector_index = None
+if config.LOCAL_VECTOR_INDEX:
+    from server.algos.encoder import EMBEDDING_DIM
+
+    vector_index = VectorIndex(
+        os.path.abspath(config.LOCAL_VECTOR_INDEX_PATH),
+        config.LOCAL_VECTOR_INDEX_CAPACITY,
+        EMBEDDING_DIM,
+        config.LOCAL_VECTOR_INDEX_MAX_AGE_HOURS * 3600,
+    )
@@ -0,0 +1,134 @@
+import threading
+import time
+
+from peewee import chunked
+
+from server import metrics
+from server.database import db, FeedCandidate, Post
+from server.logger import logger
+
+# Flush when this many inserts + deletes are pending...
+MAX_PENDING = 500
+# ...or when the oldest pending write is this old (seconds)
+MAX_AGE = 1.0
+# Rows per INSERT / URIs per DELETE ... IN, kept under SQLite's variable limit
+CHUNK_SIZE = 100
+
+
+class PostWriteBuffer:
+    """Collect Post / FeedCandidate inserts and deletes across commits and write them in batches.
+
+    Writes are flushed in one transaction with insert_many and DELETE ... IN
+    once MAX_PENDING writes are queued or the oldest is MAX_AGE seconds old.
+    Anything that must only be persisted after the buffered posts (such as the
+    firehose cursor) should be written together with flush() inside db.atomic().
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING, max_age: float = MAX_AGE):
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._creates = {}
+        self._candidates = {}
+        self._deletes = set()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, creates: list[dict], deletes: list[str], candidates: list[dict] = ()) -> None:
+        with self._lock:
+            for post_dict in creates:
+                self._creates[post_dict['uri']] = post_dict
+            for candidate in candidates:
+                self._candidates[candidate['feed_uri'], candidate['uri']] = candidate
+            for uri in deletes:
+                # a post created and deleted before the flush never hits the table
+                self._creates.pop(uri, None)
+                self._deletes.add(uri)
+            if self._deletes and self._candidates:
+                self._candidates = {
+                    key: c for key, c in self._candidates.items() if key[1] not in self._deletes
+                }
+            pending = len(self._creates) + len(self._candidates) + len(self._deletes)
+            if self._oldest is None and pending:
+                self._oldest = time.monotonic()
+            full = pending >= self.max_pending
+
+        self._ensure_flusher()
+        if full:
+            self.flush()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='post-write-buffer', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.max_age / 2)
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_age
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f'Post write buffer flush failed: {e}')
+
+    def flush(self):
+        """Write everything pending. Safe to call from any thread.
+
+        If the write fails the batch is put back, so nothing is lost and the
+        next flush retries it. Returns the batch written, for callers that
+        flush inside an outer transaction and must requeue() it if that
+        transaction rolls back.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = (self._creates, self._candidates, self._deletes, self._oldest)
+                self._creates = {}
+                self._candidates = {}
+                self._deletes = set()
+                self._oldest = None
+            creates, candidates, deletes, _ = batch
+
+            if not creates and not candidates and not deletes:
+                return None
+
+            try:
+                with metrics.sqlite_write_seconds.labels('firehose').time(), db.atomic():
+                    for uris in chunked(list(deletes), CHUNK_SIZE):
+                        Post.delete().where(Post.uri.in_(uris)).execute()
+                        FeedCandidate.delete().where(FeedCandidate.uri.in_(uris)).execute()
+                    for rows in chunked(list(creates.values()), CHUNK_SIZE):
+                        Post.insert_many(rows).execute()
+                    for rows in chunked(list(candidates.values()), CHUNK_SIZE):
+                        FeedCandidate.insert_many(rows).on_conflict_ignore().execute()
+            except Exception:
+                self.requeue(batch)
+                raise
+
+            logger.debug(
+                f'Flushed post writes: {len(creates)} added, {len(candidates)} routed, {len(deletes)} deleted'
+            )
+            return batch
+
+    def requeue(self, batch) -> None:
+        """Put a batch from flush() back in front of anything added since."""
+        if batch is None:
+            return
+        creates, candidates, deletes, oldest = batch
+        with self._lock:
+            # writes added after the batch was taken are newer and win
+            for uri, post_dict in creates.items():
+                if uri not in self._deletes:
+                    self._creates.setdefault(uri, post_dict)
+            for key, candidate in candidates.items():
+                if key[1] not in self._deletes:
+                    self._candidates.setdefault(key, candidate)
+            self._deletes |= deletes
+            if oldest is not None and (self._oldest is None or oldest < self._oldest):
+                self._oldest = oldest
+
+post_buffer = PostWriteBuffer()